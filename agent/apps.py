@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class AgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent'
+
+    def ready(self):
+        if getattr(settings, "SQLITE_PERFORMANCE_PROFILE", False):
+            from django.db.backends.signals import connection_created
+            from agent.sqlite_tuning import apply_sqlite_pragmas
+            connection_created.connect(apply_sqlite_pragmas, dispatch_uid="agent_sqlite_pragmas")
+
+        if getattr(settings, "CATALOG_LIVE_SYNC", True):
+            # Keep the products vector collection in sync with Product edits
+            from agent import signals  # noqa: F401
@@ -0,0 +1,113 @@
+# agent/background.py
+"""
+Small in-process batching worker used to move work off the request path.
+
+Items submitted from request threads are collected on a queue; a daemon
+thread hands them to ``handler`` in batches (up to ``max_batch`` items or
+whatever arrived within ``flush_interval`` seconds). Pending items are
+drained at interpreter shutdown.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker:
+    def __init__(self, name, handler, max_batch=100, flush_interval=1.0, max_queue=10000):
+        self.name = name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        atexit.register(self.drain)
+
+    def submit(self, item):
+        """Queue ``item`` for the next batch, starting the worker thread on first use."""
+        self._ensure_started()
+        with self._idle:
+            self._in_flight += 1
+        self._queue.put(item)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch):
+        try:
+            self.handler(batch)
+            self.batches += 1
+            self.items += len(batch)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name}: batch of {len(batch)} failed: {str(e)}")
+        finally:
+            with self._idle:
+                self._in_flight -= len(batch)
+                self._idle.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Block until every item submitted so far has been handled."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def drain(self, timeout=10.0):
+        """Handle everything still queued, then stop the worker thread."""
+        if self._thread is None:
+            return True
+        self._stopping.set()
+        done = self.flush(timeout)
+        self._thread.join(timeout=1.0)
+        return done
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+        }
@@ -0,0 +1,211 @@
+# agent/catalog_index.py
+"""
+Process-local index over the products collection.
+
+Category names, category listings and price ranges only need product
+metadata, so they are answered from plain Python structures built once
+from the collection instead of running a vector query per lookup.
+
+Every worker process holds its own index. The process that changes the
+collection calls ``publish_catalog_change``, which bumps the shared
+CatalogVersion row; the others compare it at most every
+``CATALOG_VERSION_CHECK_SECONDS`` and rebuild when it moved.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+_index = None
+_index_lock = threading.Lock()
+# Bumped every time the catalog changes; caches derived from products key on it
+_version = 0
+
+# Last shared CatalogVersion this process has caught up with
+_shared_version = None
+_next_check = 0.0
+_check_lock = threading.Lock()
+# Called when another process changed the catalog (e.g. to drop a search backend)
+_invalidation_hooks = []
+
+
+def product_from_record(doc, metadata):
+    """Convert a stored document + metadata pair into the product dict used by the agent."""
+    return {
+        "name": metadata["name"],
+        "category": metadata["category"],
+        "model": metadata["model"],
+        "price": metadata["price"],
+        "description": doc,
+        "stripe_price_id": metadata["stripe_price_id"]
+    }
+
+
+def build_product_document(product):
+    """Searchable text for a product dict: core fields first, then every spec attribute."""
+    doc_text = f"Name: {product['name']}\n"
+    doc_text += f"Category: {product['category']}\n"
+    doc_text += f"Model: {product['model']}\n"
+    doc_text += f"Price: ${product['price']}\n"
+    for key, value in product.items():
+        if key not in ['name', 'category', 'model', 'price', 'stripe_price_id'] and value is not None:
+            doc_text += f"{key.replace('_', ' ').title()}: {value}\n"
+    return doc_text.strip()
+
+
+class _PriceBucket:
+    """Products sorted by price with a parallel float array for bisect."""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: float(entry[1]["price"]))
+        self.ids = [product_id for product_id, _ in entries]
+        self.products = [product for _, product in entries]
+        self.prices = [float(product["price"]) for product in self.products]
+
+    def span(self, min_price, max_price):
+        lo = bisect.bisect_left(self.prices, float(min_price))
+        hi = bisect.bisect_right(self.prices, float(max_price))
+        return lo, hi
+
+
+class CatalogIndex:
+    """Category set, category buckets and sorted price arrays for the catalog."""
+
+    def __init__(self, products, ids=None):
+        self.products = list(products)
+        self.ids = list(ids) if ids is not None else [str(i) for i in range(len(self.products))]
+        self.by_category = {}
+        entries_by_category = {}
+        for product_id, product in zip(self.ids, self.products):
+            self.by_category.setdefault(product["category"], []).append(product)
+            entries_by_category.setdefault(product["category"], []).append((product_id, product))
+        self.categories = sorted(self.by_category)
+
+        self._all_prices = _PriceBucket(zip(self.ids, self.products))
+        self._category_prices = {
+            category: _PriceBucket(entries) for category, entries in entries_by_category.items()
+        }
+
+    def __len__(self):
+        return len(self.products)
+
+    def _price_bucket(self, category=None):
+        if category is None:
+            return self._all_prices
+        return self._category_prices.get(category)
+
+    def products_in_category(self, category, n_results=10):
+        return self.by_category.get(category, [])[:n_results]
+
+    def count_in_price_range(self, min_price, max_price, category=None):
+        bucket = self._price_bucket(category)
+        if bucket is None:
+            return 0
+        lo, hi = bucket.span(min_price, max_price)
+        return hi - lo
+
+    def products_in_price_range(self, min_price, max_price, n_results=10, category=None):
+        """Cheapest-first products priced within [min_price, max_price]."""
+        bucket = self._price_bucket(category)
+        if bucket is None:
+            return []
+        lo, hi = bucket.span(min_price, max_price)
+        return bucket.products[lo:min(hi, lo + n_results)]
+
+    def ids_in_price_range(self, min_price, max_price, category=None):
+        """Collection ids of every product in the range, used for semantic re-ranking."""
+        bucket = self._price_bucket(category)
+        if bucket is None:
+            return [], []
+        lo, hi = bucket.span(min_price, max_price)
+        return bucket.ids[lo:hi], bucket.products[lo:hi]
+
+
+def build_catalog_index(collection):
+    """Read every product from a Chroma collection (no embeddings) and index it."""
+    results = collection.get(include=["documents", "metadatas"])
+    products = [
+        product_from_record(doc, metadata)
+        for doc, metadata in zip(results["documents"] or [], results["metadatas"] or [])
+    ]
+    return CatalogIndex(products, ids=results["ids"])
+
+
+def get_catalog_index(collection):
+    """Return the cached index, building it from ``collection`` on first use."""
+    global _index
+    check_shared_version()
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_catalog_index(collection)
+            index = _index
+    return index
+
+
+def invalidate_catalog_index():
+    """Drop the cached index; the next lookup rebuilds it from the collection."""
+    global _index, _version
+    with _index_lock:
+        _index = None
+        _version += 1
+
+
+def catalog_version():
+    return _version
+
+
+def register_invalidation_hook(hook):
+    """Run ``hook()`` whenever another process is found to have changed the catalog."""
+    _invalidation_hooks.append(hook)
+
+
+def _read_shared_version():
+    from agent.models import CatalogVersion
+    return CatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+def check_shared_version():
+    """
+    Drop this process's catalog caches if another process published a catalog
+    change. The shared version is read at most every CATALOG_VERSION_CHECK_SECONDS.
+    """
+    global _shared_version, _next_check
+    now = time.monotonic()
+    if now < _next_check:
+        return
+    with _check_lock:
+        if now < _next_check:
+            return
+        _next_check = now + getattr(settings, "CATALOG_VERSION_CHECK_SECONDS", 5.0)
+        try:
+            shared = _read_shared_version()
+        except Exception as e:
+            logger.warning(f"Could not read the shared catalog version: {str(e)}")
+            return
+        stale = _shared_version is not None and shared != _shared_version
+        _shared_version = shared
+    if stale:
+        logger.info(f"Catalog changed elsewhere (version {shared}); rebuilding catalog caches")
+        invalidate_catalog_index()
+        for hook in _invalidation_hooks:
+            hook()
+
+
+def publish_catalog_change():
+    """Bump the shared catalog version after this process changed the collection."""
+    global _shared_version
+    from agent.models import CatalogVersion
+    with transaction.atomic():
+        CatalogVersion.objects.get_or_create(pk=1)
+        CatalogVersion.objects.filter(pk=1).update(version=F("version") + 1)
+    with _check_lock:
+        # This process already rebuilt its own caches
+        _shared_version = _read_shared_version()
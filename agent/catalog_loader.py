@@ -0,0 +1,120 @@
+# agent/catalog_loader.py
+"""
+Incremental product catalog loading into a Chroma collection.
+
+Each product's document text and metadata are hashed together and the hash
+stored in its metadata. A sync only re-embeds products that are new or
+changed in either (in batched
+encode calls), upserts them, and deletes products that are no longer in the
+catalog, so reloading a large catalog after a few edits costs seconds rather
+than a full re-embed.
+"""
+import hashlib
+import json
+import re
+import time
+
+from agent.catalog_index import build_product_document
+
+DEFAULT_BATCH_SIZE = 128
+
+
+def product_id(product):
+    """Stable collection id derived from the (unique) model name."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", str(product["model"]).replace("+", "plus")).strip("_")
+    return f"product_{slug}"
+
+
+def content_hash(document, product):
+    """
+    Hash of the document together with the full metadata, so a change to a
+    field the document leaves out (e.g. stripe_price_id) still rewrites it.
+    """
+    payload = document + "\n" + json.dumps(product, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chroma_metadata(product, doc_hash):
+    """Chroma metadata values must be scalars, so unset fields are dropped."""
+    metadata = {key: value for key, value in product.items() if value is not None}
+    metadata.setdefault("stripe_price_id", "")
+    metadata["content_hash"] = doc_hash
+    return metadata
+
+
+def _report(progress, message):
+    if progress:
+        progress(message)
+
+
+def _entry(product):
+    document = build_product_document(product)
+    return product_id(product), document, content_hash(document, product), product
+
+
+def _upsert_entries(collection, entries, encode, batch_size, progress, start):
+    embedded = 0
+    for i in range(0, len(entries), batch_size):
+        batch = entries[i:i + batch_size]
+        embeddings = encode([document for _, document, _, _ in batch])
+        collection.upsert(
+            ids=[pid for pid, _, _, _ in batch],
+            documents=[document for _, document, _, _ in batch],
+            metadatas=[chroma_metadata(product, doc_hash) for _, _, doc_hash, product in batch],
+            embeddings=[[float(x) for x in vector] for vector in embeddings],
+        )
+        embedded += len(batch)
+        elapsed = time.perf_counter() - start
+        _report(progress, f"   ✓ Embedded {embedded}/{len(entries)} "
+                          f"({embedded / elapsed:.0f} products/s)")
+    return embedded
+
+
+def delete_products(collection, ids, batch_size=DEFAULT_BATCH_SIZE):
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=list(ids[i:i + batch_size]))
+
+
+def sync_products(collection, products, encode, batch_size=DEFAULT_BATCH_SIZE,
+                  delete_missing=True, progress=print):
+    """
+    Bring ``collection`` in line with ``products``.
+
+    ``encode`` takes a list of documents and returns one embedding per document.
+    With ``delete_missing=False`` only the given products are looked up and
+    written, which is how partial (live) syncs reuse the content-hash check.
+    Returns counts of added/updated/unchanged/deleted products and throughput.
+    """
+    start = time.perf_counter()
+    wanted = {}
+    for product in products:
+        entry = _entry(product)
+        wanted[entry[0]] = entry
+
+    if delete_missing:
+        existing = collection.get(include=["metadatas"])
+    else:
+        existing = collection.get(ids=list(wanted), include=["metadatas"])
+    existing_hashes = {
+        existing_id: (metadata or {}).get("content_hash")
+        for existing_id, metadata in zip(existing["ids"], existing["metadatas"] or [])
+    }
+
+    changed = [entry for pid, entry in wanted.items() if existing_hashes.get(pid) != entry[2]]
+    added = sum(1 for entry in changed if entry[0] not in existing_hashes)
+    stale = [pid for pid in existing_hashes if pid not in wanted] if delete_missing else []
+    _report(progress, f"🔎 {len(wanted)} products: {added} new, {len(changed) - added} changed, "
+                      f"{len(wanted) - len(changed)} unchanged, {len(stale)} to delete")
+
+    embedded = _upsert_entries(collection, changed, encode, batch_size, progress, start)
+    delete_products(collection, stale, batch_size)
+
+    seconds = time.perf_counter() - start
+    return {
+        "added": added,
+        "updated": len(changed) - added,
+        "unchanged": len(wanted) - len(changed),
+        "deleted": len(stale),
+        "seconds": round(seconds, 3),
+        "products_per_second": round(embedded / seconds, 1) if embedded and seconds else 0.0,
+    }
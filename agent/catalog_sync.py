@@ -0,0 +1,110 @@
+# agent/catalog_sync.py
+"""
+Live sync from the Product model to the products vector collection.
+
+Product saves and deletes (see agent/signals.py) enqueue change events. A
+background BatchWorker collects them for about a second, re-embeds only the
+changed rows in one batch, upserts/deletes them in the collection,
+rebuilds the in-process catalog caches and publishes a new shared catalog
+version so the other workers rebuild theirs too. Edits reach chat results
+within seconds without a full reload or a worker restart.
+
+Events are idempotent (an upsert re-reads the product, a delete is by id), so
+a failed batch is retried with backoff, then applied event by event so one
+bad product or a briefly locked database doesn't lose the whole batch.
+Events that still fail are logged and counted; ``manage.py sync_catalog``
+repairs the collection from the Product table.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from agent.background import BatchWorker
+from agent.catalog_index import publish_catalog_change
+from agent.catalog_loader import delete_products, sync_products
+from agent.memory_manager import get_embedding_fn, get_products_collection, reload_catalog_index
+
+logger = logging.getLogger(__name__)
+
+_sync_stats = {"batch_retries": 0, "event_fallbacks": 0, "dropped": 0}
+
+
+def _write_changes(batch):
+    """Write a batch of ("upsert", pk) / ("delete", collection_id) events to the collection."""
+    from agent.models import Product
+
+    upsert_pks = {key for action, key in batch if action == "upsert"}
+    delete_ids = {key for action, key in batch if action == "delete"}
+
+    close_old_connections()
+    try:
+        products = [p.as_catalog_dict() for p in Product.objects.filter(pk__in=upsert_pks)]
+    finally:
+        close_old_connections()
+
+    collection = get_products_collection()
+    # Deletes first so a product re-created under the same model ends up present
+    if delete_ids:
+        delete_products(collection, sorted(delete_ids))
+    stats = {"added": 0, "updated": 0}
+    if products:
+        # Content hashes skip saves that changed neither the text nor the metadata
+        stats = sync_products(
+            collection, products, encode=get_embedding_fn(), delete_missing=False, progress=None
+        )
+    return {"added": stats["added"], "updated": stats["updated"], "deleted": len(delete_ids)}
+
+
+def _publish():
+    reload_catalog_index(reexport_vectors=True)
+    try:
+        publish_catalog_change()
+    finally:
+        close_old_connections()
+
+
+def _apply_changes(batch):
+    retries = getattr(settings, "CATALOG_SYNC_RETRIES", 3)
+    for attempt in range(retries + 1):
+        try:
+            stats = _write_changes(batch)
+            _publish()
+            logger.info(f"Catalog sync: {stats['added']} added, {stats['updated']} updated, "
+                        f"{stats['deleted']} deleted")
+            return
+        except Exception as e:
+            logger.warning(f"Catalog sync batch of {len(batch)} failed (attempt {attempt + 1}): {str(e)}")
+            close_old_connections()
+            if attempt < retries:
+                _sync_stats["batch_retries"] += 1
+                time.sleep(min(5.0, 0.1 * (2 ** attempt)))
+
+    # Isolate the events that can't be applied
+    _sync_stats["event_fallbacks"] += 1
+    applied = 0
+    for event in dict.fromkeys(batch):
+        try:
+            _write_changes([event])
+            applied += 1
+        except Exception as e:
+            logger.error(f"Dropping catalog sync event {event}: {str(e)}")
+            _sync_stats["dropped"] += 1
+    if applied:
+        _publish()
+
+
+catalog_syncer = BatchWorker("catalog-sync", _apply_changes, max_batch=500, flush_interval=1.0)
+
+
+def enqueue_product_upsert(pk):
+    catalog_syncer.submit(("upsert", pk))
+
+
+def enqueue_product_delete(collection_id):
+    catalog_syncer.submit(("delete", collection_id))
+
+
+def sync_stats():
+    return {**catalog_syncer.stats(), **_sync_stats}
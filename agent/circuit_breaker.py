@@ -0,0 +1,115 @@
+# agent/circuit_breaker.py
+"""
+Circuit breaker for calls to an external dependency (the LLM provider).
+
+The breaker keeps a rolling window of recent call outcomes. It opens when
+the window holds at least ``min_calls`` and either the error rate or the
+slow-call rate reaches its threshold. While open, ``allow()`` returns False
+so callers degrade immediately instead of waiting out timeouts. After
+``open_seconds`` it goes half-open and lets ``half_open_probes`` calls
+through: a healthy probe closes it again, a failed or slow one re-opens it.
+"""
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=20, min_calls=5, error_rate=0.5, slow_seconds=10.0,
+                 slow_rate=0.5, open_seconds=30.0, half_open_probes=1):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes = deque(maxlen=window)  # (failed, slow) per call
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes_in_flight = 0
+        self.times_opened += 1
+
+    def allow(self):
+        """True if a call may go ahead; a False answer counts as short-circuited."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def release(self):
+        """Give back a half-open probe whose call was abandoned (e.g. cancelled) without judging it."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, success, seconds):
+        """Report the outcome of a call that ``allow()`` let through."""
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if success and not slow:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((not success, slow))
+            calls = len(self._outcomes)
+            if self._state != CLOSED or calls < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            if failures / calls >= self.error_rate or slow_calls / calls >= self.slow_rate:
+                self._open()
+
+    def stats(self):
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._outcomes)
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            retry_in = (
+                max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+                if self._state == OPEN else 0.0
+            )
+            return {
+                "name": self.name,
+                "state": self._state,
+                "window_calls": calls,
+                "error_rate": round(failures / calls, 3) if calls else 0.0,
+                "slow_rate": round(slow_calls / calls, 3) if calls else 0.0,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": round(retry_in, 1),
+            }
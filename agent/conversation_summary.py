@@ -0,0 +1,109 @@
+# agent/conversation_summary.py
+"""
+Rolling per-session conversation summaries.
+
+Instead of replaying every ChatMessage row, the prompt carries a short
+summary of the older part of the conversation plus the last few messages
+verbatim. After each turn the session is queued on a background BatchWorker;
+once ``SUMMARY_REFRESH_EVERY_MESSAGES`` new messages have piled up beyond the
+verbatim window, the worker folds them into the stored summary with one
+small LLM call. The refresh never runs on the request path, and a failed
+refresh simply leaves the previous summary in place.
+"""
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from agent.background import BatchWorker
+from agent.models import ChatMessage, ConversationSummary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a sales chat between a customer and a tech store's AI sales agent.
+Update the summary with the new messages. Keep: the customer's needs, budget, preferences and objections,
+products and prices discussed, and where the conversation stands. Drop greetings and filler.
+Write at most {max_words} words of plain prose. Reply with the summary only."""
+
+
+def _enabled():
+    return getattr(settings, "CONVERSATION_SUMMARY_ENABLED", True)
+
+
+def _refresh_every():
+    return getattr(settings, "SUMMARY_REFRESH_EVERY_MESSAGES", 6)
+
+
+def _keep_verbatim():
+    return getattr(settings, "SUMMARY_KEEP_VERBATIM_MESSAGES", 4)
+
+
+def get_summary(session_id):
+    """(summary_text, summarized_until) for a session; ("", 0) when there is none yet."""
+    if not _enabled():
+        return "", 0
+    row = ConversationSummary.objects.filter(session_id=session_id).values_list(
+        "summary", "summarized_until"
+    ).first()
+    return row if row else ("", 0)
+
+
+def refresh_summary(session_id):
+    """
+    Fold messages older than the verbatim window into the session summary once
+    enough of them have accumulated. Returns True if the summary changed.
+    """
+    summary, until = get_summary(session_id)
+    pending = list(
+        ChatMessage.objects.filter(session_id=session_id, id__gt=until)
+        .order_by("id")
+        .values_list("id", "sender", "message")
+    )
+    to_fold = pending[:max(0, len(pending) - _keep_verbatim())]
+    if len(to_fold) < _refresh_every():
+        return False
+
+    from agent.llm_client import get_llm_client, LLMError
+
+    transcript = "\n".join(
+        f"{'Agent' if sender == 'agent' else 'Customer'}: {message}" for _, sender, message in to_fold
+    )
+    max_tokens = getattr(settings, "SUMMARY_MAX_TOKENS", 250)
+    messages = [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=int(max_tokens * 0.7))},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}"},
+    ]
+    try:
+        new_summary = get_llm_client().complete(messages, temperature=0.2, max_tokens=max_tokens)
+    except LLMError as e:
+        logger.warning(f"Summary refresh for {session_id} skipped: {str(e)}")
+        return False
+
+    row, _ = ConversationSummary.objects.get_or_create(session_id=session_id)
+    row.summary = new_summary
+    row.summarized_until = to_fold[-1][0]
+    row.messages_summarized += len(to_fold)
+    row.save()
+    logger.info(f"Summarized {len(to_fold)} messages for session {session_id}")
+    return True
+
+
+def _refresh_batch(session_ids):
+    # Several turns of one session in the same batch need only one refresh
+    try:
+        for session_id in dict.fromkeys(session_ids):
+            try:
+                refresh_summary(session_id)
+            except Exception as e:
+                logger.error(f"Error refreshing summary for {session_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+summary_worker = BatchWorker("summary-refresh", _refresh_batch, max_batch=200, flush_interval=2.0)
+
+
+def schedule_summary_refresh(session_id):
+    """Queue a background summary check for ``session_id`` after a completed turn."""
+    if _enabled():
+        summary_worker.submit(session_id)
@@ -0,0 +1,33 @@
+# agent/db_router.py
+"""
+Optional separate SQLite file for the chat log.
+
+When settings.DATABASES has a "chatlog" alias (CHAT_LOG_DATABASE env var),
+the high-write conversation tables live there, so chat traffic doesn't
+contend for the write lock with sessions, auth and the Product catalog.
+Create its tables with ``python manage.py migrate --database chatlog``.
+"""
+CHAT_LOG_DB = "chatlog"
+CHAT_LOG_MODELS = {"chatmessage", "conversationsummary"}
+
+
+def _is_chat_log(model):
+    return model._meta.app_label == "agent" and model._meta.model_name in CHAT_LOG_MODELS
+
+
+class ChatLogRouter:
+    def db_for_read(self, model, **hints):
+        return CHAT_LOG_DB if _is_chat_log(model) else None
+
+    def db_for_write(self, model, **hints):
+        return CHAT_LOG_DB if _is_chat_log(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == "agent" and model_name in CHAT_LOG_MODELS:
+            return db == CHAT_LOG_DB
+        if db == CHAT_LOG_DB:
+            return False
+        return None
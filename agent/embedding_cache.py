@@ -0,0 +1,82 @@
+# agent/embedding_cache.py
+"""
+Bounded LRU cache for query embeddings.
+
+Product searches embed short query strings, many of which repeat across
+requests ("Laptops products", category names, repeated customer questions).
+Caching the vectors keyed on normalised text lets those skip the
+SentenceTransformer forward pass entirely.
+"""
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive cache key for a query string."""
+    return " ".join(str(text).lower().split())
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of ``normalized text -> embedding`` with hit/miss counters."""
+
+    def __init__(self, embed_fn, max_size=2048):
+        self._embed_fn = embed_fn
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        """Return the embedding for ``text`` as a list of floats, encoding it on a miss."""
+        return self.get_many([text])[0]
+
+    def get_many(self, texts):
+        keys = [normalize_query(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            # Encode all misses in one batch, outside the lock
+            vectors = self._embed_fn(missing)
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    vector = [float(x) for x in vector]
+                    found[key] = vector
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return [found[key] for key in keys]
+
+    def warm(self, texts):
+        """Precompute embeddings for fixed queries without touching the hit/miss counters."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        self.get_many(list(texts))
+        with self._lock:
+            self.hits, self.misses = hits, misses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
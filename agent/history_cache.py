@@ -0,0 +1,214 @@
+# agent/history_cache.py
+"""
+Read-through, write-through cache of each session's recent chat history.
+
+Every turn reads history several times (prompt building, response history,
+voice chunks). Each session's newest ``HISTORY_CACHE_MESSAGES`` messages are
+kept as a ring buffer in the Django cache (the "history" alias when
+configured, else "default"). save_message appends to it, so a hot session
+doesn't reload its history from the database. The first read after a miss
+loads the buffer from the database.
+
+Entries expire after ``HISTORY_CACHE_IDLE_SECONDS`` without a read, and each
+entry is trimmed to ``HISTORY_CACHE_MAX_BYTES_PER_SESSION``. The "history"
+cache alias caps the number of sessions (MAX_ENTRIES), so the per-session
+limit times MAX_ENTRIES is the memory budget.
+
+Every session also has a version counter in the same cache, bumped by each
+save_message in any worker. An entry remembers the version it reflects and
+is only served while that still matches, so a read costs one cache round
+trip (entry and version together) and no database query. With the default
+local-memory backend the versions, like the buffers, are per process: when
+several worker processes serve chat, point the "history" alias at a shared
+backend (HISTORY_CACHE_REDIS_URL) so each worker sees the others' writes.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+MESSAGE_OVERHEAD_BYTES = 64  # id, sender, timestamp and container overhead per message
+
+_locks = [threading.RLock() for _ in range(64)]
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0}
+
+
+def enabled():
+    return getattr(settings, "HISTORY_CACHE_ENABLED", True)
+
+
+def ring_size():
+    return getattr(settings, "HISTORY_CACHE_MESSAGES", 50)
+
+
+def _cache():
+    try:
+        return caches["history"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def _key(session_id):
+    return f"chat-history:{session_id}"
+
+
+def _idle_seconds():
+    return getattr(settings, "HISTORY_CACHE_IDLE_SECONDS", 1800)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def session_lock(session_id):
+    """
+    Per-process lock striped by session. Fills hold it, and so does
+    save_message around queueing a message and appending it here, so a fill
+    never sees the message both in the queue and through the append.
+    """
+    return _locks[hash(session_id) % len(_locks)]
+
+
+def to_tuple(message_obj):
+    return (message_obj.id, message_obj.sender, message_obj.message, message_obj.timestamp)
+
+
+def _version_key(session_id):
+    return f"chat-history-version:{session_id}"
+
+
+def _current_version(session_id):
+    """The session's version, creating it if the cache has none (new or evicted)."""
+    cache, key = _cache(), _version_key(session_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from a fresh, unique value: an evicted counter restarting at a
+        # small number could otherwise come back to an old entry's version
+        cache.add(key, time.time_ns(), _idle_seconds())
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(session_id):
+    cache, key = _cache(), _version_key(session_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), _idle_seconds())
+        return cache.get(key)
+
+
+def _fit(messages, has_older, version):
+    """Trim to the ring size and the per-session byte budget, oldest first."""
+    if len(messages) > ring_size():
+        messages, has_older = messages[-ring_size():], True
+    budget = getattr(settings, "HISTORY_CACHE_MAX_BYTES_PER_SESSION", 64 * 1024)
+    size = sum(len(m[2]) + MESSAGE_OVERHEAD_BYTES for m in messages)
+    start = 0
+    while size > budget and start < len(messages) - 1:
+        size -= len(messages[start][2]) + MESSAGE_OVERHEAD_BYTES
+        start += 1
+    if start:
+        messages, has_older = messages[start:], True
+    return {"messages": messages, "has_older": has_older, "version": version}
+
+
+def _store(session_id, entry):
+    _cache().set(_key(session_id), entry, _idle_seconds())
+
+
+def peek(session_id):
+    """
+    The cached entry (``messages`` tuples oldest first, ``has_older``) or None
+    when the session isn't cached or another worker has written to it since.
+    """
+    key = _key(session_id)
+    values = _cache().get_many([key, _version_key(session_id)])
+    entry = values.get(key)
+    if entry is None:
+        _count("misses")
+        return None
+    if entry["version"] != values.get(_version_key(session_id)):
+        _count("stale")
+        return None
+    # Reading keeps the session warm; a lapsed version only costs a reload
+    _cache().touch(key, _idle_seconds())
+    _cache().touch(_version_key(session_id), _idle_seconds())
+    _count("hits")
+    return entry
+
+
+def read_through(session_id, loader):
+    """
+    Cached entry for the session, (re)filling it from ``loader()`` when it is
+    missing or stale. ``loader`` returns (ChatMessage list oldest first, has_older).
+    """
+    entry = peek(session_id)
+    if entry is not None:
+        return entry
+    with session_lock(session_id):
+        # Read the version before loading: a write landing during the load
+        # bumps it, and the entry stored here is stale on the next read
+        version = _current_version(session_id)
+        entry = _cache().get(_key(session_id))
+        if entry is None or entry["version"] != version:
+            rows, has_older = loader()
+            entry = _fit([to_tuple(m) for m in rows], has_older, version)
+            _store(session_id, entry)
+    return entry
+
+
+def append(message_obj):
+    """
+    Write-through from save_message (called under ``session_lock``). Bumps
+    the session version; the cached entry follows along only if it was
+    current, i.e. no other worker wrote in between.
+    """
+    session_id = message_obj.session_id
+    with session_lock(session_id):
+        version = _bump_version(session_id)
+        entry = _cache().get(_key(session_id))
+        if entry is None:
+            return
+        if entry["version"] + 1 != version:
+            invalidate(session_id)
+            return
+        messages = entry["messages"] + [to_tuple(message_obj)]
+        _store(session_id, _fit(messages, entry["has_older"], version))
+    _count("writes")
+
+
+def assign_ids(message_objs):
+    """Record the ids of write-behind rows once they have been inserted."""
+    by_session = {}
+    for message_obj in message_objs:
+        by_session.setdefault(message_obj.session_id, []).append(message_obj)
+    for session_id, objs in by_session.items():
+        with session_lock(session_id):
+            entry = _cache().get(_key(session_id))
+            if entry is None:
+                continue
+            ids = {(m.sender, m.message, m.timestamp): m.id for m in objs}
+            messages = [
+                (ids.get((sender, text, ts), None), sender, text, ts) if message_id is None
+                else (message_id, sender, text, ts)
+                for message_id, sender, text, ts in entry["messages"]
+            ]
+            _store(session_id, {**entry, "messages": messages})
+
+
+def invalidate(session_id):
+    _cache().delete(_key(session_id))
+
+
+def stats():
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"] + _stats["stale"]
+        return {
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+            "ring_size": ring_size(),
+        }
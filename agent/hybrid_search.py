@@ -0,0 +1,140 @@
+# agent/hybrid_search.py
+"""
+Hybrid lexical + vector product retrieval.
+
+The ``agent_product_fts`` FTS5 table (migration 0002) indexes the Product
+model's name, model and spec columns and is kept in sync by triggers. Queries
+naming an exact model ("RTX 3080", "XPS 13") are answered from BM25 alone
+without computing an embedding; everything else fuses BM25 and vector
+similarity scores.
+"""
+import logging
+import re
+
+from django.db import connection
+
+from agent.catalog_index import build_product_document, product_from_record
+from agent.memory_manager import embed_query, get_product_backend
+from agent.models import Product
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "can", "do", "for", "have", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "show", "some", "the", "to", "want", "what", "which",
+    "with", "you", "your", "need", "looking", "get", "buy", "about", "tell",
+}
+
+# Weight of the vector score in the fused ranking; the rest goes to BM25
+VECTOR_WEIGHT = 0.6
+
+
+def _tokens(query):
+    return TOKEN_PATTERN.findall(query.lower())
+
+
+def exact_phrases(query):
+    """
+    Model-number phrases in the query: every token containing a digit, joined
+    with the word right before it ("rtx 3080", "xps 13", "g502").
+    """
+    tokens = _tokens(query)
+    phrases = []
+    for i, token in enumerate(tokens):
+        if any(ch.isdigit() for ch in token):
+            if i > 0 and tokens[i - 1] not in STOPWORDS and not tokens[i - 1].isdigit():
+                phrases.append(f"{tokens[i - 1]} {token}")
+            else:
+                phrases.append(token)
+    return phrases
+
+
+def _match_expression(phrases, any_of=False):
+    quoted = [f'"{phrase}"' for phrase in phrases]
+    return (" OR " if any_of else " AND ").join(quoted)
+
+
+def lexical_search(match, n_results=10, category=None):
+    """Run an FTS5 MATCH expression and return ``(product, bm25 score)`` pairs, best first."""
+    if not match:
+        return []
+    sql = (
+        "SELECT p.id, bm25(agent_product_fts) AS rank "
+        "FROM agent_product_fts JOIN agent_product p ON p.id = agent_product_fts.rowid "
+        "WHERE agent_product_fts MATCH %s"
+    )
+    params = [match]
+    if category:
+        sql += " AND p.category = %s"
+        params.append(category)
+    sql += " ORDER BY rank LIMIT %s"
+    params.append(n_results)
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Lexical product search failed: {str(e)}")
+        return []
+
+    by_id = Product.objects.in_bulk([row[0] for row in rows])
+    results = []
+    for product_id, rank in rows:
+        obj = by_id.get(product_id)
+        if obj is None:
+            continue
+        product = obj.as_catalog_dict()
+        # bm25() is lower-is-better; flip it so higher scores are better everywhere
+        results.append((product_from_record(build_product_document(product), product), -rank))
+    return results
+
+
+def _normalized(scored):
+    if not scored:
+        return {}
+    values = [score for _, score in scored]
+    lo, hi = min(values), max(values)
+    span = (hi - lo) or 1.0
+    return {product["model"]: ((score - lo) / span if hi > lo else 1.0, product)
+            for product, score in scored}
+
+
+def fuse_scores(lexical, vector, vector_weight=VECTOR_WEIGHT):
+    """Min-max normalise both score lists and combine them per product model."""
+    lexical_norm = _normalized(lexical)
+    vector_norm = _normalized(vector)
+    fused = {}
+    for model in set(lexical_norm) | set(vector_norm):
+        lex_score, lex_product = lexical_norm.get(model, (0.0, None))
+        vec_score, vec_product = vector_norm.get(model, (0.0, None))
+        product = vec_product or lex_product
+        fused[model] = (vector_weight * vec_score + (1 - vector_weight) * lex_score, product)
+    ranked = sorted(fused.values(), key=lambda item: item[0], reverse=True)
+    return [product for _, product in ranked]
+
+
+def hybrid_search(query, n_results=5, category=None):
+    """
+    Product search combining the FTS5 index with the vector backend.
+
+    Exact model-number queries that hit the lexical index return straight away;
+    otherwise BM25 and vector scores are fused.
+    """
+    phrases = exact_phrases(query)
+    if phrases:
+        exact = lexical_search(_match_expression(phrases), n_results, category)
+        if exact:
+            return [product for product, _ in exact]
+
+    terms = [t for t in _tokens(query) if t not in STOPWORDS]
+    lexical = lexical_search(_match_expression(terms, any_of=True), n_results * 2, category)
+    try:
+        vector = get_product_backend().query_scored(
+            embed_query(query), n_results=n_results * 2, category=category
+        )
+    except Exception as e:
+        logger.error(f"Vector product search failed: {str(e)}")
+        vector = []
+    return fuse_scores(lexical, vector)[:n_results]
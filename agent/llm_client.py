@@ -0,0 +1,521 @@
+# agent/llm_client.py
+"""
+Shared HTTP client for the Groq (OpenAI-compatible) chat completions API.
+
+One pooled, keep-alive connection set per process (plus one async pool per
+event loop) instead of a fresh TCP+TLS handshake on every turn. Timeouts are
+split into connect and read; 429s, 5xx responses and connection failures are
+retried with jittered exponential backoff that honours ``Retry-After``,
+within a small total wait budget per call (``max_retry_wait``): a provider
+asking for a longer pause fails the call at once so the caller can answer
+with its fallback instead of holding the request. Read
+timeouts and dropped responses are not retried by default, so a stalled
+provider costs one read timeout rather than one per attempt.
+``base_url`` is configurable (settings.LLM_BASE_URL) so the client can be
+pointed at a local stub server. A circuit breaker (agent.circuit_breaker)
+fails calls fast while the provider is erroring or slow.
+"""
+import asyncio
+import email.utils
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from agent.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+
+
+class LLMError(RuntimeError):
+    """Request failed for good; ``str(error)`` is safe to show in debug_info."""
+
+    def __init__(self, message, status=None, circuit_open=False):
+        super().__init__(message)
+        self.status = status
+        self.circuit_open = circuit_open
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _status_error(response):
+    if response.status_code == 401:
+        return LLMError("Invalid API key. Please check your GROQ_API_KEY.", 401)
+    if response.status_code == 429:
+        return LLMError("Rate limit exceeded. Please try again later.", 429)
+    return LLMError(f"API returned status {response.status_code}", response.status_code)
+
+
+def _transport_error(exc):
+    if isinstance(exc, httpx.TimeoutException):
+        return LLMError("API timeout - please try again")
+    return LLMError("Connection error - please check your internet connection")
+
+
+def _reply_text(response):
+    try:
+        return response.json()["choices"][0]["message"]["content"].strip()
+    except (ValueError, KeyError, IndexError, TypeError):
+        logger.error(f"Invalid response format: {response.text[:200]}")
+        raise LLMError("Invalid API response format")
+
+
+STREAM_DONE = object()
+
+
+def _stream_delta(line):
+    """Content delta of one SSE line, STREAM_DONE at ``[DONE]``, else None."""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return STREAM_DONE
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+        return None
+    choices = chunk.get("choices") or []
+    return choices[0].get("delta", {}).get("content") if choices else None
+
+
+class LLMClient:
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model="llama-3.3-70b-versatile",
+                 connect_timeout=5.0, read_timeout=30.0, max_retries=2, backoff_base=0.5,
+                 backoff_max=8.0, max_retry_wait=2.0, http2=False, max_connections=20,
+                 max_keepalive_connections=10, keepalive_expiry=30.0, transport=None, breaker=None,
+                 retry_read_errors=False):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_wait = max_retry_wait
+        self.retry_read_errors = retry_read_errors
+        self.http2 = http2 and self._h2_available()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transport = transport
+        self.breaker = breaker
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "short_circuited": 0,
+            "connections_opened": 0,
+            "retry_wait_seconds": 0.0,
+            "retry_budget_exceeded": 0,
+            "total_latency_seconds": 0.0,
+            "status_codes": {},
+        }
+
+    @staticmethod
+    def _h2_available():
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("LLM_HTTP2 is on but the 'h2' package is missing; using HTTP/1.1")
+            return False
+
+    # ---- Clients ----
+    def _client_kwargs(self):
+        return {
+            "base_url": self.base_url,
+            "timeout": self.timeout,
+            "limits": self.limits,
+            "http2": self.http2,
+            "headers": {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            },
+        }
+
+    def _sync_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    kwargs = self._client_kwargs()
+                    if self._transport is not None:
+                        kwargs["transport"] = self._transport
+                    self._client = httpx.Client(**kwargs)
+        return self._client
+
+    def _async_client(self):
+        # httpx async pools are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(**self._client_kwargs())
+            self._async_clients[loop] = client
+        return client
+
+    # ---- Metrics ----
+    def _record(self, key, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    def _record_status(self, status):
+        with self._lock:
+            codes = self._metrics["status_codes"]
+            codes[status] = codes.get(status, 0) + 1
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self._record("connections_opened")
+
+    async def _atrace(self, event_name, info):
+        self._trace(event_name, info)
+
+    def metrics(self):
+        with self._lock:
+            snapshot = {**self._metrics, "status_codes": dict(self._metrics["status_codes"])}
+        attempts = snapshot["attempts"]
+        snapshot["connection_reuse_rate"] = (
+            round(1 - snapshot["connections_opened"] / attempts, 3) if attempts else 0.0
+        )
+        snapshot["avg_latency_seconds"] = (
+            round(snapshot["total_latency_seconds"] / snapshot["requests"], 3)
+            if snapshot["requests"] else 0.0
+        )
+        snapshot["total_latency_seconds"] = round(snapshot["total_latency_seconds"], 3)
+        snapshot["retry_wait_seconds"] = round(snapshot["retry_wait_seconds"], 3)
+        snapshot.update(base_url=self.base_url, http2=self.http2,
+                        pooled_async_loops=len(self._async_clients),
+                        circuit=self.breaker.stats() if self.breaker is not None else None)
+        return snapshot
+
+    # ---- Retry policy ----
+    def _backoff(self, attempt, response=None, waited=0.0):
+        """
+        Full-jitter exponential backoff; a Retry-After header wins when present.
+        Returns None when the wait would overrun ``max_retry_wait`` for the call.
+        """
+        remaining = self.max_retry_wait - waited
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after if retry_after <= remaining else None
+        if remaining <= 0:
+            return None
+        return min(remaining, random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+    def _should_retry(self, attempt, response=None, exc=None):
+        if attempt >= self.max_retries:
+            return False
+        if exc is not None:
+            # Only errors raised before the request went out are safe to resend:
+            # after a read timeout the provider may still be generating (and
+            # billing) the first completion, and waiting again multiplies latency
+            return isinstance(exc, RETRYABLE_TRANSPORT_ERRORS) or self.retry_read_errors
+        return response.status_code in RETRYABLE_STATUSES
+
+    def _payload(self, messages, **overrides):
+        if not isinstance(messages, list) or not messages:
+            raise LLMError("Invalid message format")
+        return {"model": self.model, "messages": messages,
+                "temperature": 0.7, "max_tokens": 800, **overrides}
+
+    def _send(self, payload, stream=False):
+        """POST with retries; returns an open 200 response (caller closes it)."""
+        client = self._sync_client()
+        attempt = 0
+        waited = 0.0
+        while True:
+            self._record("attempts")
+            response = None
+            transport_exc = None
+            try:
+                request = client.build_request("POST", "/chat/completions", json=payload,
+                                               extensions={"trace": self._trace})
+                response = client.send(request, stream=stream)
+                self._record_status(response.status_code)
+                if response.status_code == 200:
+                    return response
+                error = _status_error(response)
+                if stream:
+                    response.read()
+                logger.error(f"API Error: {response.status_code} - {response.text[:200]}")
+                response.close()
+            except httpx.TransportError as e:
+                error = _transport_error(e)
+                transport_exc = e
+                logger.warning(f"GROQ API transport error: {type(e).__name__}")
+
+            if not self._should_retry(attempt, response, transport_exc):
+                raise error
+            delay = self._backoff(attempt, response, waited)
+            if delay is None:
+                self._record("retry_budget_exceeded")
+                raise error
+            self._record("retries")
+            self._record("retry_wait_seconds", delay)
+            time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    async def _asend(self, payload, stream=False):
+        client = self._async_client()
+        attempt = 0
+        waited = 0.0
+        while True:
+            self._record("attempts")
+            response = None
+            transport_exc = None
+            try:
+                request = client.build_request("POST", "/chat/completions", json=payload,
+                                               extensions={"trace": self._atrace})
+                response = await client.send(request, stream=stream)
+                self._record_status(response.status_code)
+                if response.status_code == 200:
+                    return response
+                error = _status_error(response)
+                if stream:
+                    await response.aread()
+                logger.error(f"API Error: {response.status_code} - {response.text[:200]}")
+                await response.aclose()
+            except httpx.TransportError as e:
+                error = _transport_error(e)
+                transport_exc = e
+                logger.warning(f"GROQ API transport error: {type(e).__name__}")
+
+            if not self._should_retry(attempt, response, transport_exc):
+                raise error
+            delay = self._backoff(attempt, response, waited)
+            if delay is None:
+                self._record("retry_budget_exceeded")
+                raise error
+            self._record("retries")
+            self._record("retry_wait_seconds", delay)
+            await asyncio.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    # ---- Public API ----
+    def _admit(self, messages, **overrides):
+        """Validate the request and consult the breaker; returns the payload."""
+        self._check_key()
+        payload = self._payload(messages, **overrides)
+        self._record("requests")
+        if self.breaker is not None and not self.breaker.allow():
+            self._record("short_circuited")
+            raise LLMError("LLM circuit open - using fallback", circuit_open=True)
+        return payload
+
+    def _finish(self, start, success):
+        """
+        Report the outcome of an admitted call. ``success=None`` means the call
+        was abandoned (cancelled, generator closed): it frees a half-open probe
+        without counting as a success or a failure.
+        """
+        if success is None:
+            if self.breaker is not None:
+                self.breaker.release()
+            return
+        seconds = time.perf_counter() - start
+        self._record("total_latency_seconds", seconds)
+        if not success:
+            self._record("failures")
+        if self.breaker is not None:
+            self.breaker.record(success, seconds)
+
+    def breaker_state(self):
+        return self.breaker.state if self.breaker is not None else None
+
+    def complete(self, messages, **overrides):
+        """Return the assistant reply text; raises LLMError."""
+        payload = self._admit(messages, **overrides)
+        start = time.perf_counter()
+        success = None
+        try:
+            reply = _reply_text(self._send(payload))
+            success = True
+        except LLMError:
+            success = False
+            raise
+        except httpx.HTTPError as e:
+            success = False
+            raise _transport_error(e) from e
+        finally:
+            self._finish(start, success)
+        return reply
+
+    async def acomplete(self, messages, **overrides):
+        """Async counterpart of ``complete``."""
+        payload = self._admit(messages, **overrides)
+        start = time.perf_counter()
+        success = None  # stays None if the task is cancelled (client disconnected)
+        try:
+            reply = _reply_text(await self._asend(payload))
+            success = True
+        except LLMError:
+            success = False
+            raise
+        except httpx.HTTPError as e:
+            success = False
+            raise _transport_error(e) from e
+        finally:
+            self._finish(start, success)
+        return reply
+
+    def stream(self, messages, **overrides):
+        """
+        Yield content deltas (``stream: true``). Retries only happen before the
+        first byte; an error mid-stream, or a body that ends without the
+        ``[DONE]`` marker, ends the generator with LLMError. The breaker judges
+        the call by its time to first byte.
+        """
+        payload = self._admit(messages, stream=True, **overrides)
+        start = time.perf_counter()
+        success = None
+        try:
+            response = self._send(payload, stream=True)
+            success = True
+        except LLMError:
+            success = False
+            raise
+        except httpx.HTTPError as e:
+            success = False
+            raise _transport_error(e) from e
+        finally:
+            self._finish(start, success)
+        done = False
+        try:
+            for line in response.iter_lines():
+                delta = _stream_delta(line)
+                if delta is STREAM_DONE:
+                    done = True
+                    break
+                if delta:
+                    yield delta
+        except httpx.TransportError as e:
+            self._record("failures")
+            raise _transport_error(e)
+        finally:
+            response.close()
+        if not done:
+            # Body ended without the [DONE] marker: the reply may be truncated
+            self._record("failures")
+            raise LLMError("Stream ended before completion")
+
+    async def astream(self, messages, **overrides):
+        """Async counterpart of ``stream`` (an async generator of content deltas)."""
+        payload = self._admit(messages, stream=True, **overrides)
+        start = time.perf_counter()
+        success = None
+        try:
+            response = await self._asend(payload, stream=True)
+            success = True
+        except LLMError:
+            success = False
+            raise
+        except httpx.HTTPError as e:
+            success = False
+            raise _transport_error(e) from e
+        finally:
+            self._finish(start, success)
+        done = False
+        try:
+            async for line in response.aiter_lines():
+                delta = _stream_delta(line)
+                if delta is STREAM_DONE:
+                    done = True
+                    break
+                if delta:
+                    yield delta
+        except httpx.TransportError as e:
+            self._record("failures")
+            raise _transport_error(e)
+        finally:
+            await response.aclose()
+        if not done:
+            self._record("failures")
+            raise LLMError("Stream ended before completion")
+
+    def warm(self):
+        """Open a pooled connection (TCP+TLS) ahead of the first chat turn."""
+        if not self.api_key:
+            return
+        client = self._sync_client()
+        self._record("attempts")
+        response = client.get("/models", extensions={"trace": self._trace})
+        self._record_status(response.status_code)
+
+    def _check_key(self):
+        if not self.api_key:
+            logger.error("GROQ_API_KEY is not set in environment variables")
+            raise LLMError("API key not configured. Please set GROQ_API_KEY environment variable.")
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Process-wide LLMClient configured from settings."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    api_key=getattr(settings, "GROQ_API_KEY", None),
+                    base_url=getattr(settings, "LLM_BASE_URL", DEFAULT_BASE_URL),
+                    model=getattr(settings, "LLM_MODEL", "llama-3.3-70b-versatile"),
+                    connect_timeout=getattr(settings, "LLM_CONNECT_TIMEOUT", 5.0),
+                    read_timeout=getattr(settings, "LLM_READ_TIMEOUT", 30.0),
+                    max_retries=getattr(settings, "LLM_MAX_RETRIES", 2),
+                    retry_read_errors=getattr(settings, "LLM_RETRY_READ_ERRORS", False),
+                    backoff_base=getattr(settings, "LLM_BACKOFF_BASE", 0.5),
+                    backoff_max=getattr(settings, "LLM_BACKOFF_MAX", 8.0),
+                    max_retry_wait=getattr(settings, "LLM_MAX_RETRY_WAIT", 2.0),
+                    http2=getattr(settings, "LLM_HTTP2", False),
+                    max_connections=getattr(settings, "LLM_MAX_CONNECTIONS", 20),
+                    max_keepalive_connections=getattr(settings, "LLM_MAX_KEEPALIVE_CONNECTIONS", 10),
+                    breaker=CircuitBreaker(
+                        "llm",
+                        window=getattr(settings, "LLM_BREAKER_WINDOW", 20),
+                        min_calls=getattr(settings, "LLM_BREAKER_MIN_CALLS", 5),
+                        error_rate=getattr(settings, "LLM_BREAKER_ERROR_RATE", 0.5),
+                        slow_seconds=getattr(settings, "LLM_BREAKER_SLOW_SECONDS", 10.0),
+                        slow_rate=getattr(settings, "LLM_BREAKER_SLOW_RATE", 0.5),
+                        open_seconds=getattr(settings, "LLM_BREAKER_OPEN_SECONDS", 30.0),
+                    ),
+                )
+    return _client
@@ -3,16 +3,38 @@ import sys
 import chromadb # type: ignore
 from products_data import products
 
+# Make the project root importable when run from the agent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.catalog_loader import sync_products
+from agent.vector_backends import export_numpy_index
+
+# Must match the collection agent.model_registry opens at runtime
+COLLECTION_NAME = "products_data"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def publish_change():
+    """Bump the shared catalog version so running workers reload their catalog index"""
+    try:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "website_sale_agent.settings")
+        import django
+        django.setup()
+        from agent.catalog_index import publish_catalog_change
+        publish_catalog_change()
+        print("📣 Published the catalog change to running workers")
+    except Exception as e:
+        print(f"⚠️ Could not publish the catalog change: {e}")
+        print("   Running workers keep their catalog index until they restart")
+
 def load_products_to_chromadb():
-    """Load products from product_data.py into ChromaDB"""
-    
-    print(f"📦 Starting to load {len(products)} products...")
+    """Incrementally sync products from products_data.py into ChromaDB"""
+
+    print(f"📦 Starting to sync {len(products)} products...")
     print(f"🗂️ Current working directory: {os.getcwd()}")
-    
+
     # Set ChromaDB path relative to the root project directory
     # Since we're in /agent folder, go up one level to root
     chroma_path = "../chroma_db"
-    
+
     # Initialize ChromaDB with persistent storage
     try:
         client = chromadb.PersistentClient(path=chroma_path)
@@ -20,114 +42,63 @@ def load_products_to_chromadb():
     except Exception as e:
         print(f"❌ Failed to initialize ChromaDB: {e}")
         return False
-    
-    # Delete existing collection if it exists
+
+    # Open (or create) the collection the app reads, with the same embedding function
     try:
-        client.delete_collection("products")
-        print("🗑️ Deleted existing products collection")
+        from chromadb.utils import embedding_functions # type: ignore
+
+        embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=EMBEDDING_MODEL_NAME
+        )
+        collection = client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            embedding_function=embedding_fn  # type: ignore[arg-type]
+        )
+        print(f"✅ Opened '{COLLECTION_NAME}' collection ({collection.count()} products stored)")
     except Exception as e:
-        print(f"📝 No existing collection to delete: {e}")
-    
-    # Create new collection with custom embedding function
+        print(f"❌ Failed to open collection: {e}")
+        return False
+
+    # Re-embed only new or changed products (batched encode), upsert them and
+    # delete products that are no longer in the catalog
     try:
-        # Use sentence transformers for embeddings (avoiding onnxruntime)
-        from sentence_transformers import SentenceTransformer # type: ignore
-        
-        # Initialize the embedding model
-        embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-        
-        # Create collection without default embedding function
-        collection = client.create_collection(
-            name="products"
-        )
-        print("✅ Created new products collection with custom embeddings")
+        stats = sync_products(collection, products, encode=embedding_fn)
+        print(f"📤 Sync finished in {stats['seconds']}s: {stats['added']} added, "
+              f"{stats['updated']} updated, {stats['unchanged']} unchanged, "
+              f"{stats['deleted']} deleted ({stats['products_per_second']} products/s embedded)")
+        if stats['added'] or stats['updated'] or stats['deleted']:
+            publish_change()
     except Exception as e:
-        print(f"❌ Failed to create collection: {e}")
+        print(f"❌ Error syncing products:")
+        print(f"   Error type: {type(e).__name__}")
+        print(f"   Error message: {str(e)}")
         return False
-    
-    # Prepare data for ChromaDB
-    documents = []
-    metadatas = []
-    ids = []
-    
-    print("📝 Preparing product data...")
-    
-    for i, product in enumerate(products):
-        # Create comprehensive searchable text
-        doc_text = f"Name: {product['name']}\n"
-        doc_text += f"Category: {product['category']}\n"
-        doc_text += f"Model: {product['model']}\n"
-        doc_text += f"Price: ${product['price']}\n"
-        
-        # Add all available attributes
-        for key, value in product.items():
-            if key not in ['name', 'category', 'model', 'price', 'stripe_price_id']:
-                doc_text += f"{key.replace('_', ' ').title()}: {value}\n"
-        
-        documents.append(doc_text.strip())
-        metadatas.append(product)
-        
-        # Clean product name for ID
-        clean_name = product['name'].replace(' ', '_').replace('/', '_').replace('+', 'plus').replace('(', '').replace(')', '')
-        ids.append(f"product_{i}_{clean_name}")
-    
-    print(f"📤 Adding {len(documents)} products to ChromaDB with custom embeddings...")
-    
-    # Generate embeddings manually
-    print("🧠 Generating embeddings...")
-    embeddings = []
-    for doc in documents:
-        embedding = embedding_model.encode(doc)
-        embeddings.append(embedding.tolist())
-    
-    # Add to ChromaDB in smaller batches to avoid memory issues
-    batch_size = 10
-    for i in range(0, len(documents), batch_size):
-        batch_end = min(i + batch_size, len(documents))
-        batch_docs = documents[i:batch_end]
-        batch_metas = metadatas[i:batch_end]
-        batch_ids = ids[i:batch_end]
-        batch_embeddings = embeddings[i:batch_end]
-        
-        try:
-            collection.add(
-                documents=batch_docs,
-                metadatas=batch_metas,
-                ids=batch_ids,
-                embeddings=batch_embeddings
-            )
-            print(f"   ✓ Added batch {i//batch_size + 1}: products {i+1}-{batch_end}")
-            
-        except Exception as e:
-            print(f"❌ Error adding batch {i//batch_size + 1}:")
-            print(f"   Error type: {type(e).__name__}")
-            print(f"   Error message: {str(e)}")
-            
-            # Print problematic IDs for debugging
-            print(f"   Problematic IDs: {batch_ids}")
-            return False
-    
+
     # Verify the upload
     try:
         count = collection.count()
         print(f"🔍 Verification: ChromaDB now contains {count} products")
-        
+
         if count > 0:
             # Test a quick search
             test_results = collection.query(
                 query_texts=["laptop"],
                 n_results=min(3, count)
             )
-            
+
             print(f"🔍 Test search for 'laptop' found {len(test_results['ids'][0])} results:")
             for metadata in test_results['metadatas'][0]:
                 print(f"   - {metadata['name']} (${metadata['price']})")
-            
+
+            # Export the matrix used by PRODUCT_SEARCH_BACKEND = "numpy"
+            exported = export_numpy_index(collection, os.path.join(chroma_path, "product_vectors"))
+            print(f"🧮 Exported {exported} product vectors for the numpy search backend")
+
             return True
         else:
             print("❌ Verification failed: No products found after upload")
             return False
-            
+
     except Exception as e:
         print(f"❌ Error during verification: {e}")
         return False
@@ -135,10 +106,11 @@ def load_products_to_chromadb():
 if __name__ == "__main__":
     print("=== ChromaDB Product Loader (from agent folder) ===")
     success = load_products_to_chromadb()
-    
+
     if success:
         print("\n🎉 SUCCESS: All products loaded successfully!")
         print("   Run 'cd .. && python chromadebug.py' to verify")
+        print("   Running workers reload their catalog index on their next version check")
     else:
         print("\n💥 FAILED: Could not load products to ChromaDB")
-        print("   Check the error messages above for details")
\ No newline at end of file
+        print("   Check the error messages above for details")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from agent.catalog_index import publish_catalog_change
+from agent.catalog_loader import sync_products
+from agent.memory_manager import get_embedding_fn, get_products_collection, reload_catalog_index
+from agent.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile the products vector collection with the Product table: re-embed new or "
+        "changed rows and delete products that no longer exist."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-from-static",
+            action="store_true",
+            help="First create/update Product rows from agent/products_data.py.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed_from_static"]:
+            from agent.products_data import products
+
+            for product in products:
+                fields = {key: value for key, value in product.items() if key != "model"}
+                Product.objects.update_or_create(model=product["model"], defaults=fields)
+            self.stdout.write(f"Seeded {len(products)} products from products_data.py")
+
+        catalog = [product.as_catalog_dict() for product in Product.objects.all()]
+        stats = sync_products(
+            get_products_collection(), catalog, encode=get_embedding_fn(), progress=self.stdout.write
+        )
+        reload_catalog_index(reexport_vectors=True)
+        # Running workers pick the change up on their next version check
+        publish_catalog_change()
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {len(catalog)} products: {stats['added']} added, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['deleted']} deleted in {stats['seconds']}s"
+        ))
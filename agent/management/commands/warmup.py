@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.warmup import run_warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the embedding and Whisper models, run one dummy embedding and transcription, "
+        "build the catalog caches and open connections. Run it in a deploy step to fetch "
+        "model weights and export search indexes before workers take traffic."
+    )
+
+    def handle(self, *args, **options):
+        state = run_warmup()
+        for name, seconds in state["steps"].items():
+            self.stdout.write(f"  {name:<14} {seconds:.2f}s")
+        if state["status"] != "ready":
+            raise CommandError(f"Warm-up failed: {state['error']}")
+        self.stdout.write(self.style.SUCCESS("Warm-up complete"))
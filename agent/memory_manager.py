@@ -1,57 +1,261 @@
 # agent/memory_manager.py
 
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+import time
+from collections import OrderedDict, deque
 
-# ---- Chroma Client Setup ----
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
+import numpy as np
+from django.conf import settings
 
-# ---- Embedding Function ----
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
+from agent import model_registry
+from agent.background import BatchWorker
+from agent.catalog_index import (
+    check_shared_version,
+    get_catalog_index,
+    invalidate_catalog_index,
+    register_invalidation_hook,
 )
+from agent.embedding_cache import QueryEmbeddingCache
+from agent.vector_backends import create_backend, export_numpy_index
 
-# ---- Collections ----
-# Conversation memory collection (existing)
-conversation_collection = chroma_client.get_or_create_collection(
-    name="conversation_memory",
-    embedding_function=embedding_fn  # type: ignore[arg-type]
-)
+# ---- Lazy Models & Collections ----
+# The Chroma client, the MiniLM embedding function and both collections are
+# loaded by the model registry on first use, never at import time.
+def get_embedding_fn():
+    return model_registry.get("embedding_fn")
 
-# Products collection (NEW)
-products_collection = chroma_client.get_or_create_collection(
-    name="products_data",
-    embedding_function=embedding_fn  # type: ignore[arg-type]
-)
+def get_conversation_collection():
+    return model_registry.get("conversation_collection")
+
+def get_products_collection():
+    return model_registry.get("products_collection")
+
+# Query embeddings are cached so repeated and fixed queries skip the model
+query_embedding_cache = QueryEmbeddingCache(lambda texts: get_embedding_fn()(texts), max_size=2048)
+
+# Fixed query strings used by the search helpers; embedded once at startup
+UTILITY_QUERIES = ["products", "categories"]
+
+# Per-session window of the latest memory documents, written through by add_memory
+RECENT_MEMORY_WINDOW = 10
+MAX_CACHED_SESSIONS = 1000
+_recent_memories = OrderedDict()
+_recent_memories_lock = threading.Lock()
+# Memories queued on the memory writer but not yet in Chroma: session_id -> {seq: document}
+_pending_memories = {}
+_pending_memories_lock = threading.Lock()
+
+# Price-range queries with at most this many in-range products are re-ranked
+# in-process; larger ranges are pushed down to Chroma as a metadata filter.
+RERANK_POOL_SIZE = 256
+
+# ---- Retrieval Backend ----
+_product_backend = None
+_product_backend_lock = threading.Lock()
+
+def get_product_backend():
+    """Return the product search backend selected by settings.PRODUCT_SEARCH_BACKEND."""
+    global _product_backend
+    check_shared_version()
+    backend = _product_backend
+    if backend is None:
+        with _product_backend_lock:
+            if _product_backend is None:
+                _product_backend = create_backend(
+                    getattr(settings, "PRODUCT_SEARCH_BACKEND", "chroma"),
+                    get_products_collection(),
+                    numpy_path=getattr(settings, "PRODUCT_VECTORS_PATH", "./chroma_db/product_vectors"),
+                )
+            backend = _product_backend
+    return backend
+
+def _drop_product_backend():
+    # Another process re-exported the vectors; reopen them on next use
+    global _product_backend
+    with _product_backend_lock:
+        _product_backend = None
+
+register_invalidation_hook(_drop_product_backend)
+
+# ---- Query Embeddings ----
+def embed_query(text: str):
+    """Embedding for a query string, served from the LRU cache when possible."""
+    return query_embedding_cache.get(text)
+
+def warm_query_cache():
+    """Precompute embeddings for the fixed category and utility queries."""
+    try:
+        fixed = [f"{category} products" for category in get_all_categories()]
+        query_embedding_cache.warm(fixed + UTILITY_QUERIES)
+    except Exception as e:
+        print(f"[MemoryManager] Error while warming query cache: {e}")
 
 # ---- Conversation Memory Functions (existing) ----
+def allocate_memory_seq(session_id: str) -> int:
+    """
+    Atomically hand out the next memory sequence number for a session.
+
+    The counter lives in the MemorySequence table, so allocation is one UPDATE
+    regardless of history length and concurrent requests for the same session
+    never receive the same number. A session's counter is seeded once from
+    the documents already stored for it, so pre-existing ids are not reused.
+    """
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+
+    from agent.models import MemorySequence
+
+    with transaction.atomic():
+        counter = MemorySequence.objects.filter(session_id=session_id)
+        if not counter.update(last_seq=F("last_seq") + 1):
+            existing = get_conversation_collection().get(where={"session_id": session_id}, include=[])
+            try:
+                with transaction.atomic():
+                    MemorySequence.objects.create(session_id=session_id, last_seq=len(existing["ids"]) + 1)
+            except IntegrityError:
+                # Another request created the counter first
+                counter.update(last_seq=F("last_seq") + 1)
+        return counter.values_list("last_seq", flat=True).get()
+
+def _write_memory_batch(batch):
+    """Embed and insert queued memory documents in one call each."""
+    ids = [item["id"] for item in batch]
+    documents = [item["document"] for item in batch]
+    try:
+        get_conversation_collection().add(
+            ids=ids,
+            documents=documents,
+            metadatas=[item["metadata"] for item in batch],
+            embeddings=get_embedding_fn()(documents)
+        )
+    finally:
+        with _pending_memories_lock:
+            for item in batch:
+                session_id = item["metadata"]["session_id"]
+                queued = _pending_memories.get(session_id)
+                if queued is None:
+                    continue
+                queued.pop(item["metadata"]["seq"], None)
+                if not queued:
+                    del _pending_memories[session_id]
+
+def _pending_window(session_id: str):
+    """Queued (seq, document) pairs of a session that aren't in Chroma yet."""
+    with _pending_memories_lock:
+        return dict(_pending_memories.get(session_id, {}))
+
+memory_writer = BatchWorker("memory-writer", _write_memory_batch, max_batch=64, flush_interval=0.5)
+
 def add_memory(user_message: str, bot_reply: str, session_id: str):
-    """Add user and bot messages to Chroma."""
+    """
+    Queue user and bot messages for insertion into Chroma.
+
+    Only the sequence allocation runs on the caller's thread; embedding and
+    insertion happen in batches on the memory writer. Returns the memory id.
+    """
     try:
-        existing = conversation_collection.get(where={"session_id": session_id})
-        next_id = len(existing["ids"]) + 1
+        seq = allocate_memory_seq(session_id)
+        memory_id = f"{session_id}-{seq}"
+        document = f"User: {user_message}\nBot: {bot_reply}"
+        with _pending_memories_lock:
+            _pending_memories.setdefault(session_id, {})[seq] = document
+        memory_writer.submit({
+            "id": memory_id,
+            "document": document,
+            "metadata": {"session_id": session_id, "seq": seq, "created_at": time.time()},
+        })
+        _remember_recent(session_id, seq, document)
+        return memory_id
+    except Exception as e:
+        print(f"[MemoryManager] Error while adding memory: {e}")
+        return None
 
-        conversation_collection.add(
-            documents=[f"User: {user_message}\nBot: {bot_reply}"],
-            metadatas=[{"session_id": session_id}],
-            ids=[f"{session_id}-{next_id}"]
+def _remember_recent(session_id: str, seq: int, document: str):
+    with _recent_memories_lock:
+        window = _recent_memories.get(session_id)
+        if window is None:
+            # Not cached yet; the next read loads the window from Chroma
+            return
+        if any(cached_seq == seq for cached_seq, _ in window):
+            # Already merged from the queue when the window was loaded
+            return
+        window.append((seq, document))
+        _recent_memories.move_to_end(session_id)
+
+def _recent_window(session_id: str):
+    """Latest memories for a session as (seq, document) pairs, oldest first."""
+    with _recent_memories_lock:
+        window = _recent_memories.get(session_id)
+        if window is not None:
+            _recent_memories.move_to_end(session_id)
+            return list(window)
+
+    from agent.models import MemorySequence
+
+    # Cold session: read it back from Chroma and merge in this session's queued
+    # writes. The queue is read before Chroma, so a memory written in between
+    # shows up in one of the two (duplicates collapse on seq).
+    entries = _pending_window(session_id)
+    last_seq = MemorySequence.objects.filter(session_id=session_id).values_list("last_seq", flat=True).first()
+    window = deque(maxlen=RECENT_MEMORY_WINDOW)
+    if last_seq:
+        results = get_conversation_collection().get(
+            where={"$and": [
+                {"session_id": session_id},
+                {"seq": {"$gt": last_seq - RECENT_MEMORY_WINDOW}},
+            ]},
+            include=["documents", "metadatas"]
+        )
+        entries.update(
+            (metadata["seq"], doc) for doc, metadata in zip(results["documents"], results["metadatas"])
         )
+
+    with _recent_memories_lock:
+        # Also whatever this session queued while Chroma was being read; later
+        # add_memory calls see the installed window and append to it
+        entries.update(_pending_window(session_id))
+        window.extend(sorted(entries.items()))
+        _recent_memories[session_id] = window
+        _recent_memories.move_to_end(session_id)
+        while len(_recent_memories) > MAX_CACHED_SESSIONS:
+            _recent_memories.popitem(last=False)
+        return list(window)
+
+def recall_memory(session_id: str, user_message: str, query_embedding=None,
+                  n_recent: int = 3, n_relevant: int = 3):
+    """
+    Recall conversation memory for the current turn.
+
+    Returns ``{"recent": [...], "relevant": [...]}``: the last ``n_recent``
+    exchanges from the cached recency window, plus the ``n_relevant`` older
+    exchanges most similar to ``user_message``. Pass the embedding already
+    computed for product search as ``query_embedding``; otherwise it comes
+    from the query embedding cache, where product search has usually put it.
+    """
+    try:
+        recent = _recent_window(session_id)[-n_recent:] if n_recent else []
+        relevant = []
+        if n_relevant:
+            if query_embedding is None:
+                query_embedding = embed_query(user_message)
+            recent_ids = {f"{session_id}-{seq}" for seq, _ in recent}
+            results = get_conversation_collection().query(
+                query_embeddings=[query_embedding],
+                where={"session_id": session_id},
+                n_results=n_relevant + len(recent_ids)
+            )
+            for memory_id, doc in zip(results["ids"][0], results["documents"][0]):
+                if memory_id not in recent_ids and len(relevant) < n_relevant:
+                    relevant.append(doc)
+        return {"recent": [doc for _, doc in recent], "relevant": relevant}
     except Exception as e:
-        print(f"[MemoryManager] Error while adding memory: {e}")
+        print(f"[MemoryManager] Error while recalling memory: {e}")
+        return {"recent": [], "relevant": []}
 
 def get_memory(session_id: str, n_results: int = 5):
-    """Fetch recent conversation history for a session."""
+    """Fetch recent conversation history for a session, oldest first (no embedding needed)."""
     try:
-        results = conversation_collection.query(
-            query_texts=["recent conversation"],
-            where={"session_id": session_id},
-            n_results=n_results
-        )
-        docs = results.get("documents")
-        if not docs:  # handle None or empty
-            return []
-        # flatten nested list
-        return [doc for sublist in docs for doc in sublist]
+        return [doc for _, doc in _recent_window(session_id)[-n_results:]]
     except Exception as e:
         print(f"[MemoryManager] Error while fetching memory: {e}")
         return []
@@ -60,34 +264,9 @@ def get_memory(session_id: str, n_results: int = 5):
 def search_products(query: str, n_results: int = 5, category_filter: str = None):
     """Search for products based on user query."""
     try:
-        # Build where clause for category filtering
-        where_clause = {}
-        if category_filter:
-            where_clause["category"] = category_filter
-        
-        results = products_collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where=where_clause if where_clause else None
+        return get_product_backend().query(
+            embed_query(query), n_results=n_results, category=category_filter
         )
-        
-        if not results["documents"] or not results["documents"][0]:
-            return []
-        
-        # Format results for the agent
-        products = []
-        for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
-            products.append({
-                "name": metadata["name"],
-                "category": metadata["category"],
-                "model": metadata["model"],
-                "price": metadata["price"],
-                "description": doc,
-                "stripe_price_id": metadata["stripe_price_id"]
-            })
-        
-        return products
-        
     except Exception as e:
         print(f"[MemoryManager] Error while searching products: {e}")
         return []
@@ -95,96 +274,106 @@ def search_products(query: str, n_results: int = 5, category_filter: str = None)
 def get_product_by_category(category: str, n_results: int = 10):
     """Get products from a specific category."""
     try:
-        results = products_collection.query(
-            query_texts=[f"{category} products"],
-            where={"category": category},
-            n_results=n_results
-        )
-        
-        if not results["documents"] or not results["documents"][0]:
-            return []
-        
-        products = []
-        for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
-            products.append({
-                "name": metadata["name"],
-                "category": metadata["category"],
-                "model": metadata["model"],
-                "price": metadata["price"],
-                "description": doc,
-                "stripe_price_id": metadata["stripe_price_id"]
-            })
-        
-        return products
-        
+        return get_catalog_index(get_products_collection()).products_in_category(category, n_results)
     except Exception as e:
         print(f"[MemoryManager] Error while fetching category products: {e}")
         return []
 
-def get_products_in_price_range(min_price: int, max_price: int, n_results: int = 10):
-    """Get products within a specific price range."""
+def get_products_in_price_range(min_price: int, max_price: int, n_results: int = 10,
+                                category: str = None, query: str = None):
+    """
+    Get products within a specific price range.
+
+    Without ``query`` the cheapest matches come straight from the sorted price
+    index. With ``query`` the in-range products are re-ranked by similarity:
+    on Chroma, small candidate sets are scored against their stored embeddings
+    and larger ones become a filtered vector query on the price metadata; the
+    numpy backend always applies the range as a mask over its matrix.
+    """
     try:
-        # Note: ChromaDB doesn't support range queries directly
-        # So we'll get all products and filter in Python
-        results = products_collection.query(
-            query_texts=["products"],
-            n_results=100  # Get more to filter
-        )
-        
-        if not results["documents"] or not results["documents"][0]:
+        index = get_catalog_index(get_products_collection())
+        if not query:
+            return index.products_in_price_range(min_price, max_price, n_results, category)
+
+        candidate_count = index.count_in_price_range(min_price, max_price, category)
+        if candidate_count == 0:
             return []
-        
-        filtered_products = []
-        for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
-            price = int(metadata["price"])
-            if min_price <= price <= max_price:
-                filtered_products.append({
-                    "name": metadata["name"],
-                    "category": metadata["category"],
-                    "model": metadata["model"],
-                    "price": metadata["price"],
-                    "description": doc,
-                    "stripe_price_id": metadata["stripe_price_id"]
-                })
-        
-        # Return only requested number of results
-        return filtered_products[:n_results]
-        
+        backend = get_product_backend()
+        if backend.name == "chroma" and candidate_count <= RERANK_POOL_SIZE:
+            ids, candidates = index.ids_in_price_range(min_price, max_price, category)
+            return _rerank_by_query(query, ids, candidates)[:n_results]
+
+        return backend.query(
+            embed_query(query),
+            n_results=min(n_results, candidate_count),
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+        )
+
     except Exception as e:
         print(f"[MemoryManager] Error while fetching products by price: {e}")
         return []
 
+def _rerank_by_query(query: str, ids, candidates):
+    """Order candidate products by cosine similarity of their stored embeddings to ``query``."""
+    stored = get_products_collection().get(ids=list(ids), include=["embeddings"])
+    vectors = dict(zip(stored["ids"], stored["embeddings"]))
+    query_vec = np.asarray(embed_query(query), dtype=np.float32)
+    query_vec /= np.linalg.norm(query_vec) or 1.0
+
+    scored = []
+    for product_id, product in zip(ids, candidates):
+        vec = vectors.get(product_id)
+        if vec is None:
+            continue
+        vec = np.asarray(vec, dtype=np.float32)
+        scored.append((float(vec @ query_vec) / (np.linalg.norm(vec) or 1.0), product))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [product for _, product in scored]
+
 # ---- Utility Functions ----
 def get_all_categories():
     """Get list of all available product categories."""
     try:
-        # Get a sample of products to extract categories
-        results = products_collection.query(
-            query_texts=["categories"],
-            n_results=100
-        )
-        
-        if not results["metadatas"] or not results["metadatas"][0]:
-            return []
-        
-        categories = list(set([metadata["category"] for metadata in results["metadatas"][0]]))
-        return sorted(categories)
-        
+        return list(get_catalog_index(get_products_collection()).categories)
     except Exception as e:
         print(f"[MemoryManager] Error while fetching categories: {e}")
         return []
 
+def reload_catalog_index(reexport_vectors: bool = False):
+    """
+    Rebuild the in-memory catalog index and search backend after the products
+    collection changed. ``reexport_vectors`` also rewrites the numpy backend's
+    matrix from the collection, for changes made by this process.
+    """
+    global _product_backend
+    invalidate_catalog_index()
+    with _product_backend_lock:
+        if reexport_vectors and getattr(settings, "PRODUCT_SEARCH_BACKEND", "chroma") == "numpy":
+            export_numpy_index(
+                get_products_collection(),
+                getattr(settings, "PRODUCT_VECTORS_PATH", "./chroma_db/product_vectors"),
+            )
+        _product_backend = None
+    return get_catalog_index(get_products_collection())
+
 def get_collection_stats():
     """Get statistics about the collections."""
     try:
-        conversation_count = conversation_collection.count()
-        products_count = products_collection.count()
+        conversation_count = get_conversation_collection().count()
+        products_count = get_products_collection().count()
         
         return {
             "conversations": conversation_count,
             "products": products_count,
-            "categories": get_all_categories()
+            "categories": get_all_categories(),
+            "search_backend": getattr(settings, "PRODUCT_SEARCH_BACKEND", "chroma"),
+            "query_cache": query_embedding_cache.stats(),
+            "memory_writer": memory_writer.stats()
         }
     except Exception as e:
         print(f"[MemoryManager] Error while getting stats: {e}")
-        return {"conversations": 0, "products": 0, "categories": []}
\ No newline at end of file
+        return {"conversations": 0, "products": 0, "categories": []}
+
+model_registry.register_warmup_hook(warm_query_cache)
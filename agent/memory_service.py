@@ -1,20 +1,212 @@
 # agent/memory_service.py
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, router, transaction
+from django.db.models import Q
+
+from . import history_cache
+from .background import BatchWorker
 from .models import ChatMessage  # Import your Django model
 from datetime import datetime
 import pytz
 
 PAKISTAN_TZ = pytz.timezone("Asia/Karachi")
 
+logger = logging.getLogger(__name__)
+
+# ---- Write-behind chat log ----
+# save_message queues the row and returns at once; a background BatchWorker
+# bulk-inserts queued rows in one transaction (one fsync per batch instead of
+# one per message) and drains the queue at shutdown. Until a row is stored it
+# stays in _pending, and get_history merges those rows in, so a session always
+# reads its own writes. A failed batch is retried with backoff, then written
+# row by row so one bad row or a locked database doesn't lose the whole batch.
+_pending = {}  # session_id -> list of unsaved ChatMessage objects, oldest first
+_pending_lock = threading.Lock()
+_write_stats = {"batch_retries": 0, "row_fallbacks": 0, "dropped": 0}
+
+def _insert_batch(batch):
+    for message_obj in batch:
+        # A rolled-back attempt may have assigned ids already
+        message_obj.id = None
+        message_obj._state.adding = True
+    with transaction.atomic(using=router.db_for_write(ChatMessage)):
+        ChatMessage.objects.bulk_create(batch)
+
+def _insert_with_retries(batch):
+    """Bulk insert, retrying with backoff; returns (stored, given_up) rows."""
+    retries = getattr(settings, "CHAT_LOG_WRITE_RETRIES", 3)
+    for attempt in range(retries + 1):
+        try:
+            _insert_batch(batch)
+            return batch, []
+        except IntegrityError as e:
+            # A bad row won't get better with retries
+            logger.warning(f"Chat log batch of {len(batch)} rejected: {str(e)}")
+            break
+        except Exception as e:
+            logger.warning(f"Chat log batch of {len(batch)} failed (attempt {attempt + 1}): {str(e)}")
+            close_old_connections()
+            if attempt < retries:
+                _write_stats["batch_retries"] += 1
+                time.sleep(min(5.0, 0.1 * (2 ** attempt)))
+
+    # Isolate the rows that can't be written
+    _write_stats["row_fallbacks"] += 1
+    stored, given_up = [], []
+    for message_obj in batch:
+        try:
+            _insert_batch([message_obj])
+            stored.append(message_obj)
+        except Exception as e:
+            logger.error(f"Dropping chat message for session {message_obj.session_id}: {str(e)}")
+            given_up.append(message_obj)
+    _write_stats["dropped"] += len(given_up)
+    return stored, given_up
+
+def _flush_messages(batch):
+    try:
+        stored, given_up = _insert_with_retries(batch)
+        if history_cache.enabled():
+            history_cache.assign_ids(stored)
+            # Cached copies of lost rows would disagree with the database
+            for session_id in {m.session_id for m in given_up}:
+                history_cache.invalidate(session_id)
+        with _pending_lock:
+            for message_obj in batch:
+                queued = _pending.get(message_obj.session_id)
+                if queued is None:
+                    continue
+                try:
+                    queued.remove(message_obj)
+                except ValueError:
+                    pass
+                if not queued:
+                    del _pending[message_obj.session_id]
+    finally:
+        close_old_connections()
+
+message_writer = BatchWorker("chat-log-writer", _flush_messages, max_batch=500, flush_interval=0.2)
+
+def writer_stats():
+    return {**message_writer.stats(), **_write_stats}
+
 def save_message(session_id, sender, message):
-    timestamp = datetime.now(PAKISTAN_TZ)
-    # DB me save karein
-    message_obj = ChatMessage.objects.create(
-        session_id=session_id,
-        sender=sender,
-        message=message,
-        timestamp=timestamp
-    )
+    # Under the session's cache lock, so a concurrent history-cache fill sees
+    # this message either in the database/queue or through the append, never
+    # both, and the cache appends in timestamp order
+    with history_cache.session_lock(session_id):
+        message_obj = ChatMessage(
+            session_id=session_id,
+            sender=sender,
+            message=message,
+            timestamp=datetime.now(PAKISTAN_TZ)
+        )
+        if not getattr(settings, "CHAT_LOG_WRITE_BEHIND", True):
+            # DB me save karein
+            message_obj.save()
+        else:
+            with _pending_lock:
+                _pending.setdefault(session_id, []).append(message_obj)
+            message_writer.submit(message_obj)
+            # ``id`` is filled in once the writer has flushed the row
+
+        if history_cache.enabled():
+            history_cache.append(message_obj)
     return message_obj
 
-def get_history(session_id, limit=10):
-    return ChatMessage.objects.filter(session_id=session_id).order_by("-timestamp")[:limit][::-1]
+def pending_messages(session_id):
+    """Messages of a session that are queued but not yet written."""
+    with _pending_lock:
+        return list(_pending.get(session_id, ()))
+
+def get_history(session_id, limit=10, before=None):
+    """
+    The ``limit`` most recent messages of a session, oldest first.
+
+    The newest page is read through the per-session history cache
+    (agent/history_cache.py), which save_message writes through, so hot
+    sessions don't query the database. Older pages use keyset pagination
+    over (timestamp, id): pass ``before=(timestamp, id)`` of the oldest
+    message already shown. Both are served by the (session_id, timestamp)
+    index. The newest page includes this session's queued, not yet written
+    messages.
+    """
+    if before is None and history_cache.enabled() and limit <= history_cache.ring_size():
+        entry = history_cache.read_through(session_id, lambda: _load_recent(session_id))
+        if limit <= len(entry["messages"]) or not entry["has_older"]:
+            return [_from_cache(session_id, m) for m in entry["messages"][-limit:]]
+    return _query_history(session_id, limit, before)
+
+def _load_recent(session_id):
+    size = history_cache.ring_size()
+    rows = _query_history(session_id, size + 1)
+    return rows[-size:], len(rows) > size
+
+def _from_cache(session_id, cached):
+    message_id, sender, message, timestamp = cached
+    return ChatMessage(id=message_id, session_id=session_id, sender=sender, message=message, timestamp=timestamp)
+
+def _query_history(session_id, limit, before=None):
+    # Snapshot the queue before querying: a row flushed in between then shows up
+    # in the query and is recognised by its id, instead of slipping past both
+    pending = pending_messages(session_id) if before is None else []
+    queryset = ChatMessage.objects.filter(session_id=session_id)
+    if before is not None:
+        before_ts, before_id = before
+        queryset = queryset.filter(Q(timestamp__lt=before_ts) | Q(timestamp=before_ts, id__lt=before_id))
+    rows = list(queryset.order_by("-timestamp", "-id")[:limit])
+    rows.reverse()
+    if pending:
+        stored_ids = {row.id for row in rows}
+        rows += [m for m in pending if m.id is None or m.id not in stored_ids]
+        rows = rows[-limit:]
+    return rows
+
+def get_messages_after(session_id, after_id, limit=50):
+    """
+    Stored messages newer than ``after_id`` (a message id the client already
+    has), oldest first. Queued rows appear here once the writer has flushed them.
+    """
+    cached = _cached_messages_after(session_id, after_id) if history_cache.enabled() else None
+    if cached is not None:
+        return cached[:limit]
+    return list(
+        ChatMessage.objects.filter(session_id=session_id, id__gt=after_id).order_by("id")[:limit]
+    )
+
+def _cached_messages_after(session_id, after_id):
+    """Answer a delta from the history cache when it provably holds every newer row, else None."""
+    entry = history_cache.peek(session_id)
+    if entry is None:
+        return None
+    messages = entry["messages"]
+    while messages and messages[-1][0] is None:
+        messages = messages[:-1]  # still queued: not part of the stored history yet
+    if any(m[0] is None for m in messages):
+        return None
+    if entry["has_older"] and not (messages and messages[0][0] <= after_id):
+        return None
+    return [_from_cache(session_id, m) for m in messages if m[0] > after_id]
+
+def get_history_page(session_id, before_id=None, limit=50):
+    """
+    One page of history ending just before ``before_id`` (newest page when None),
+    oldest first. Returns (messages, has_more).
+    """
+    queryset = ChatMessage.objects.filter(session_id=session_id)
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    rows = list(queryset.order_by("-id")[:limit + 1])
+    return rows[:limit][::-1], len(rows) > limit
+
+def latest_message_id(session_id):
+    return (
+        ChatMessage.objects.filter(session_id=session_id)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    ) or 0
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Product columns mirrored into the FTS5 index. Kept local to the migration so
+# later model changes don't alter what this migration creates.
+FTS_COLUMNS = [
+    "name", "category", "model", "processor", "memory", "storage", "display",
+    "graphics", "chipset", "type", "switch_type", "sensor_type", "dpi",
+    "connectivity", "compatibility", "features",
+]
+
+
+def create_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    statements = [
+        f"CREATE VIRTUAL TABLE agent_product_fts USING fts5({cols}, "
+        f"content='agent_product', content_rowid='id', tokenize='unicode61')",
+        # Triggers keep the index in sync on every insert/update/delete of a Product row
+        f"CREATE TRIGGER agent_product_fts_ai AFTER INSERT ON agent_product BEGIN "
+        f"INSERT INTO agent_product_fts(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER agent_product_fts_ad AFTER DELETE ON agent_product BEGIN "
+        f"INSERT INTO agent_product_fts(agent_product_fts, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER agent_product_fts_au AFTER UPDATE ON agent_product BEGIN "
+        f"INSERT INTO agent_product_fts(agent_product_fts, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO agent_product_fts(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        "INSERT INTO agent_product_fts(agent_product_fts) VALUES ('rebuild')",
+    ]
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for trigger in ("agent_product_fts_ai", "agent_product_fts_ad", "agent_product_fts_au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    schema_editor.execute("DROP TABLE IF EXISTS agent_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0002_product_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemorySequence',
+            fields=[
+                ('session_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('last_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-17 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0007_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session_id', 'id'], name='chatmsg_session_id_idx'),
+        ),
+    ]
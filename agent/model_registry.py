@@ -0,0 +1,105 @@
+# agent/model_registry.py
+"""
+Central lazy registry for heavy models and clients.
+
+Nothing here is loaded at import time. Each entry is built on first use
+(``get("whisper")``) or all at once at an explicit warm-up point
+(``warm_up()``), so ``manage.py migrate``/``check`` and plain imports of
+``agent.views`` never pull in torch, Whisper or SentenceTransformers.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_loaders = {}
+_instances = {}
+_load_seconds = {}
+_warmup_hooks = []
+_lock = threading.RLock()
+
+
+def register(name, loader):
+    """Register a zero-argument ``loader`` that builds the object called ``name``."""
+    _loaders[name] = loader
+
+
+def register_warmup_hook(hook):
+    """Run ``hook()`` after the models are loaded during ``warm_up()``."""
+    if hook not in _warmup_hooks:
+        _warmup_hooks.append(hook)
+
+
+def get(name):
+    """Return the object registered as ``name``, loading it on first use."""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            start = time.perf_counter()
+            _instances[name] = _loaders[name]()
+            _load_seconds[name] = time.perf_counter() - start
+            logger.info(f"Loaded {name} in {_load_seconds[name]:.2f}s")
+        return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def loaded_models():
+    """Names of loaded entries with the seconds each took to load."""
+    return {name: round(seconds, 3) for name, seconds in _load_seconds.items()}
+
+
+def warm_up(names=None):
+    """Load the given entries (default: all registered) and run the warm-up hooks."""
+    for name in names or list(_loaders):
+        get(name)
+    for hook in _warmup_hooks:
+        hook()
+
+
+# ---- Loaders ----
+def _load_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=str(getattr(settings, "CHROMA_PATH", "./chroma_db")))
+
+
+def _load_embedding_fn():
+    from chromadb.utils import embedding_functions
+    return embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=getattr(settings, "EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    )
+
+
+def _load_conversation_collection():
+    return get("chroma_client").get_or_create_collection(
+        name="conversation_memory",
+        embedding_function=get("embedding_fn")  # type: ignore[arg-type]
+    )
+
+
+def _load_products_collection():
+    # Product reads and writes always pass embeddings explicitly, so opening
+    # the collection doesn't pull in the embedding model
+    return get("chroma_client").get_or_create_collection(
+        name="products_data",
+        embedding_function=None
+    )
+
+
+def _load_whisper():
+    import whisper
+    return whisper.load_model(getattr(settings, "WHISPER_MODEL_NAME", "base"))
+
+
+register("chroma_client", _load_chroma_client)
+register("embedding_fn", _load_embedding_fn)
+register("conversation_collection", _load_conversation_collection)
+register("products_collection", _load_products_collection)
+register("whisper", _load_whisper)
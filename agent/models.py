@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Product(models.Model):
     name = models.CharField(max_length=255) #This line added
@@ -37,8 +38,27 @@ class Product(models.Model):
     
     stripe_price_id = models.CharField(max_length=200, null=True, blank=True)
 
+    SPEC_FIELDS = [
+        "processor", "memory", "storage", "display", "graphics", "cooling", "cooling_type",
+        "display_type", "resolution", "refresh_rate", "size", "connectivity", "type",
+        "switch_type", "lighting", "sensor_type", "dpi", "buttons", "chipset", "capacity",
+        "read_speed", "write_speed", "speed", "features", "ports", "compatibility", "length",
+    ]
+
     def __str__(self):
         return f"{self.category} - {self.model}"
+
+    def as_catalog_dict(self):
+        """Product in the same shape as the entries of products_data.products."""
+        price = int(self.price) if float(self.price).is_integer() else self.price
+        product = {"name": self.name, "category": self.category, "model": self.model}
+        for field in self.SPEC_FIELDS:
+            value = getattr(self, field)
+            if value:
+                product[field] = value
+        product["stripe_price_id"] = self.stripe_price_id
+        product["price"] = price
+        return product
 # agent/models.py
 from django.db import models
 
@@ -46,7 +66,52 @@ class ChatMessage(models.Model):
     session_id = models.CharField(max_length=100)
     sender = models.CharField(max_length=20)  # 'user' or 'agent'
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when save_message is called, not when the write-behind queue flushes
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # History lookups: WHERE session_id = ? ORDER BY timestamp, id (id rides
+            # along in SQLite indexes as the rowid, so keyset pages stay index-only)
+            models.Index(fields=["session_id", "timestamp"], name="chatmsg_session_ts_idx"),
+            # Cursor lookups by id: deltas after last_seen_id, /history/ pages and the
+            # newest id per session (WHERE session_id = ? ORDER BY id)
+            models.Index(fields=["session_id", "id"], name="chatmsg_session_id_idx"),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp}] {self.sender}: {self.message}"
+
+
+class MemorySequence(models.Model):
+    """Last conversation-memory sequence number handed out per session."""
+    session_id = models.CharField(max_length=100, primary_key=True)
+    last_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.session_id}: {self.last_seq}"
+
+
+class ConversationSummary(models.Model):
+    """Rolling LLM summary of a session's older messages (see agent/conversation_summary.py)."""
+    session_id = models.CharField(max_length=100, primary_key=True)
+    summary = models.TextField(blank=True, default="")
+    # Highest ChatMessage id folded into the summary; later messages are sent verbatim
+    summarized_until = models.BigIntegerField(default=0)
+    messages_summarized = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.session_id}: {self.messages_summarized} messages summarized"
+
+
+class CatalogVersion(models.Model):
+    """
+    Single row bumped whenever a process changes the products collection, so
+    every other worker notices and rebuilds its catalog caches (see agent/catalog_index.py).
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"catalog v{self.version}"
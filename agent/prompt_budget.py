@@ -0,0 +1,136 @@
+# agent/prompt_budget.py
+"""
+Token-budgeted prompt assembly.
+
+The LLM input is kept under ``max_input_tokens`` so prompt size (and
+latency) stays flat however long the conversation runs:
+
+* the current user message is always kept;
+* product context is cut to whole products that fit ``max_product_tokens``;
+* a rolling conversation summary, when there is one, rides in the system prompt;
+* each history turn is truncated to ``max_turn_tokens`` and turns are added
+  newest-first until the budget runs out, so the oldest turns drop first.
+
+Token counts use tiktoken's cl100k_base encoding (close to the Llama 3
+tokenizer for English; tiktoken is in requirements.txt). tiktoken downloads
+the encoding file on first use, so offline hosts should pre-populate
+TIKTOKEN_CACHE_DIR; if the encoding can't be loaded, counts fall back to a
+characters/4 estimate and a warning is logged. ``tokenizer_name()`` (also in
+each turn's prompt stats) says which one is in use.
+"""
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD = 4  # role + separators per chat message
+TRUNCATION_MARK = " …"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, using a chars/4 token estimate: {str(e)}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def tokenizer_name():
+    return "tiktoken" if _get_encoding() is not None else "heuristic"
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text or ""))
+    return math.ceil(len(text or "") / 4)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut ``text`` to at most ``max_tokens`` tokens, marking the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK))
+    encoding = _get_encoding()
+    if encoding is not None:
+        head = encoding.decode(encoding.encode(text)[:keep])
+    else:
+        head = text[:keep * 4]
+    return head.rstrip() + TRUNCATION_MARK
+
+
+def fit_blocks(blocks, max_tokens):
+    """Longest prefix of ``blocks`` whose joined text fits ``max_tokens``."""
+    kept, used = [], 0
+    for block in blocks:
+        cost = count_tokens(block)
+        if used + cost > max_tokens:
+            break
+        kept.append(block)
+        used += cost
+    return kept
+
+
+def assemble_messages(build_system_prompt, products_info, history, user_message, summary="",
+                      max_input_tokens=3000, max_turn_tokens=300, max_product_tokens=1200):
+    """
+    Build the chat ``messages`` list within the token budget.
+
+    ``build_system_prompt(products_info)`` renders the system prompt; it is
+    given a copy of ``products_info`` whose ``products_context`` holds only
+    the product blocks that fit. ``history`` is a list of (role, text) pairs,
+    oldest first, not including the current user message. A rolling
+    ``summary`` of earlier turns is appended to the system prompt.
+    Returns (messages, stats).
+    """
+    user_tokens = count_tokens(user_message) + MESSAGE_OVERHEAD
+
+    blocks = products_info.get("context_blocks") or []
+    kept_blocks = fit_blocks(blocks, max_product_tokens)
+    if len(kept_blocks) < len(blocks):
+        products_info = {**products_info, "products_context": "".join(kept_blocks)}
+    system_prompt = build_system_prompt(products_info)
+    if summary:
+        system_prompt += f"\nConversation so far (summary of earlier messages):\n{summary}\n"
+    system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+
+    remaining = max_input_tokens - system_tokens - user_tokens
+    turns, truncated = [], 0
+    for role, text in reversed(history):
+        trimmed = truncate_to_tokens(text, max_turn_tokens)
+        cost = count_tokens(trimmed) + MESSAGE_OVERHEAD
+        if cost > remaining:
+            break
+        truncated += trimmed is not text
+        turns.append({"role": role, "content": trimmed})
+        remaining -= cost
+    turns.reverse()
+
+    messages = [{"role": "system", "content": system_prompt}, *turns,
+                {"role": "user", "content": user_message}]
+    history_tokens = max_input_tokens - system_tokens - user_tokens - remaining
+    return messages, {
+        "prompt_tokens": system_tokens + history_tokens + user_tokens,
+        "system_tokens": system_tokens,
+        "history_tokens": history_tokens,
+        "user_tokens": user_tokens,
+        "history_turns": len(turns),
+        "history_turns_dropped": len(history) - len(turns),
+        "history_turns_truncated": truncated,
+        "products_in_context": len(kept_blocks) if blocks else 0,
+        "summary_tokens": count_tokens(summary) if summary else 0,
+        "max_input_tokens": max_input_tokens,
+        "tokenizer": tokenizer_name(),
+    }
@@ -0,0 +1,88 @@
+# agent/query_planner.py
+"""
+Turn a customer message into a single product retrieval.
+
+The message is parsed once into intents (category, price bounds, free text)
+and those are executed as one filtered retrieval, instead of running a
+semantic search, a category lookup and a price lookup that overwrite each
+other.
+"""
+import re
+
+from agent.hybrid_search import hybrid_search
+from agent.memory_manager import get_all_categories, get_products_in_price_range
+
+PRICE_PATTERN = re.compile(r"\$?(\d+)(?:\s*(?:to|-)?\s*\$?(\d+))?")
+PRICE_KEYWORDS = ("budget", "price", "under", "between")
+
+
+def detect_category(message_lower, categories):
+    """Return the first catalog category named (singular or plural) in the message."""
+    for category in categories:
+        if category.lower() in message_lower or category.lower().rstrip("s") in message_lower:
+            return category
+    return None
+
+
+def detect_price_bounds(user_message, message_lower):
+    """Return (min_price, max_price) when the message asks about price, else (None, None)."""
+    if not any(keyword in message_lower for keyword in PRICE_KEYWORDS):
+        return None, None
+    price_match = PRICE_PATTERN.search(user_message)
+    if not price_match:
+        return None, None
+
+    min_price = int(price_match.group(1))
+    max_price = int(price_match.group(2)) if price_match.group(2) else min_price + 500
+    if "under" in message_lower:
+        max_price = min_price
+        min_price = 0
+    return min_price, max_price
+
+
+def plan_query(user_message, categories=None):
+    """Parse a message into the intents used for retrieval."""
+    message_lower = user_message.lower()
+    if categories is None:
+        categories = get_all_categories()
+    min_price, max_price = detect_price_bounds(user_message, message_lower)
+    return {
+        "text": user_message,
+        "category": detect_category(message_lower, categories),
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+
+
+def _retrieve(plan, n_results):
+    if plan["min_price"] is not None:
+        return get_products_in_price_range(
+            plan["min_price"],
+            plan["max_price"],
+            n_results=n_results,
+            category=plan["category"],
+            query=plan["text"],
+        )
+    return hybrid_search(plan["text"], n_results=n_results, category=plan["category"])
+
+
+def execute_plan(plan, n_results=5):
+    """
+    Run one retrieval that applies every intent in the plan. When the combined
+    filters match nothing ("laptops under $300" with no such laptop), relax
+    them - first the price bound, then the category - so the customer still
+    sees the closest products. Dropped filters are listed in ``plan["relaxed"]``.
+    """
+    relaxed = []
+    attempt = dict(plan)
+    results = _retrieve(attempt, n_results)
+    if not results and attempt["min_price"] is not None:
+        attempt.update(min_price=None, max_price=None)
+        relaxed.append("price")
+        results = _retrieve(attempt, n_results)
+    if not results and attempt["category"] is not None:
+        attempt["category"] = None
+        relaxed.append("category")
+        results = _retrieve(attempt, n_results)
+    plan["relaxed"] = relaxed
+    return results
@@ -0,0 +1,167 @@
+# agent/response_cache.py
+"""
+Semantic cache of LLM replies for repeated, context-free customer questions.
+
+"what laptops do you have" and "What laptops do you sell?" retrieve the same
+products and deserve the same answer, so a reply generated for one is reused
+for the other. Entries are keyed on the query embedding (cosine similarity
+above a threshold) *and* a fingerprint of the retrieved product set, expire
+after a TTL, are evicted LRU past a size limit, and are dropped wholesale
+whenever the catalog version changes.
+
+Only replies generated without conversation history are stored, and they are
+only served to first-turn or context-free messages, so follow-ups that lean
+on earlier turns ("is the second one cheaper?") always reach the LLM.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from agent.catalog_index import catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Words that make a message depend on earlier turns
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|it's|this|that|these|those|them|they|one|ones|first|second|third|last|"
+    r"previous|above|same|other|another|else|more|cheaper|better|instead|also|again)\b",
+    re.IGNORECASE,
+)
+
+
+def is_context_free(user_message):
+    return not FOLLOW_UP_PATTERN.search(user_message)
+
+
+def products_fingerprint(products_data):
+    """Order-insensitive hash of the retrieved products (name and price)."""
+    items = sorted(f"{p.get('name')}|{p.get('price')}" for p in products_data or [])
+    return hashlib.sha1("\n".join(items).encode("utf-8")).hexdigest()
+
+
+class SemanticResponseCache:
+    def __init__(self, threshold=0.92, ttl=600, max_entries=512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> entry dict
+        self._next_key = 0
+        self._catalog_version = catalog_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def _check_catalog(self):
+        version = catalog_version()
+        if version != self._catalog_version:
+            self._entries.clear()
+            self._catalog_version = version
+
+    def lookup(self, embedding, fingerprint):
+        """Best cached entry for this query and product set, or None."""
+        vector = _unit(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_catalog()
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self._entries.items()):
+                if now - entry["created_at"] > self.ttl:
+                    del self._entries[key]
+                    continue
+                if entry["fingerprint"] != fingerprint:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self.hits += 1
+            self.latency_saved += entry["llm_seconds"]
+            return {**entry, "similarity": round(best_score, 4)}
+
+    def store(self, embedding, fingerprint, reply, lead_stage, emotion, llm_seconds):
+        with self._lock:
+            self._check_catalog()
+            self._entries[self._next_key] = {
+                "vector": _unit(embedding),
+                "fingerprint": fingerprint,
+                "reply": reply,
+                "lead_stage": lead_stage,
+                "emotion": emotion,
+                "llm_seconds": llm_seconds,
+                "created_at": time.time(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+response_cache = SemanticResponseCache(
+    threshold=getattr(settings, "RESPONSE_CACHE_THRESHOLD", 0.92),
+    ttl=getattr(settings, "RESPONSE_CACHE_TTL", 600),
+    max_entries=getattr(settings, "RESPONSE_CACHE_MAX_ENTRIES", 512),
+)
+
+
+def cache_probe(user_message, products_info, first_turn):
+    """
+    Decide whether this turn may use the cache and, if so, embed the message.
+    Returns ``None`` when the cache does not apply, else a probe dict with
+    ``hit`` (cached entry or None) and what ``remember_reply`` needs.
+    """
+    if not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+        return None
+    if not (first_turn or is_context_free(user_message)):
+        return None
+    try:
+        from agent.memory_manager import embed_query
+        embedding = embed_query(user_message)
+    except Exception as e:
+        logger.error(f"Response cache embedding failed: {str(e)}")
+        return None
+    fingerprint = products_fingerprint(products_info["products_data"])
+    return {
+        "embedding": embedding,
+        "fingerprint": fingerprint,
+        "first_turn": first_turn,
+        "hit": response_cache.lookup(embedding, fingerprint),
+    }
+
+
+def remember_reply(probe, reply, lead_stage, emotion, llm_seconds):
+    """Store an LLM reply if it was generated without conversation history."""
+    if probe is None or probe["hit"] is not None or not probe["first_turn"]:
+        return
+    response_cache.store(probe["embedding"], probe["fingerprint"], reply, lead_stage, emotion, llm_seconds)
@@ -0,0 +1,37 @@
+# agent/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from agent.catalog_loader import product_id
+from agent.catalog_sync import enqueue_product_delete, enqueue_product_upsert
+from agent.models import Product
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_catalog_id(sender, instance, **kwargs):
+    """Capture the collection id before a save so a renamed model drops its old entry."""
+    instance._previous_catalog_id = None
+    if instance.pk:
+        old_model = sender.objects.filter(pk=instance.pk).values_list("model", flat=True).first()
+        if old_model is not None and old_model != instance.model:
+            instance._previous_catalog_id = product_id({"model": old_model})
+
+
+@receiver(post_save, sender=Product)
+def queue_product_upsert(sender, instance, **kwargs):
+    previous_id = getattr(instance, "_previous_catalog_id", None)
+    pk = instance.pk
+
+    def enqueue():
+        if previous_id:
+            enqueue_product_delete(previous_id)
+        enqueue_product_upsert(pk)
+
+    transaction.on_commit(enqueue)
+
+
+@receiver(post_delete, sender=Product)
+def queue_product_delete(sender, instance, **kwargs):
+    collection_id = product_id({"model": instance.model})
+    transaction.on_commit(lambda: enqueue_product_delete(collection_id))
@@ -0,0 +1,125 @@
+# agent/small_talk.py
+"""
+Fast path for greetings and small talk.
+
+The phrases in ``agent.casual_responses`` are compiled once into an
+Aho-Corasick automaton, so one pass over the normalised message finds every
+phrase it contains. A message counts as pure small talk when the matched
+phrases plus a few filler words cover all of it ("hi there!", "thanks a
+lot"). Those turns get the canned reply in microseconds; anything with real
+content ("hi, do you have gaming laptops?") falls through to search + LLM.
+"""
+import re
+import threading
+from collections import deque
+
+from agent.casual_responses import casual_responses
+
+# Words allowed around a small-talk phrase without making it a real question
+FILLER_WORDS = {
+    "there", "again", "so", "very", "much", "a", "lot", "ok", "okay", "please",
+    "dear", "sir", "madam", "buddy", "friend", "all", "everyone", "guys", "and",
+    "too", "for", "the", "help", "today", "then", "now",
+}
+
+_NON_WORD = re.compile(r"[^a-z0-9' ]+")
+
+
+def normalize(text):
+    """Lower-case, punctuation to spaces, single-spaced."""
+    return " ".join(_NON_WORD.sub(" ", str(text).lower()).split())
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over whole-word phrases."""
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for phrase in phrases:
+            self._add(normalize(phrase))
+        self._build_failure_links()
+
+    def _add(self, phrase):
+        state = 0
+        for char in phrase:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append(phrase)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """(start, end, phrase) for every phrase occurring on word boundaries in ``text``."""
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for phrase in self._output[state]:
+                start, end = i - len(phrase) + 1, i + 1
+                if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                    matches.append((start, end, phrase))
+        return matches
+
+
+class SmallTalkResponder:
+    def __init__(self, responses):
+        self._responses = {normalize(phrase): reply for phrase, reply in responses.items()}
+        self._matcher = PhraseMatcher(self._responses)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def reply(self, message):
+        """Canned reply if ``message`` is pure small talk, else None."""
+        text = normalize(message)
+        reply = self._match(text) if text else None
+        with self._lock:
+            self.lookups += 1
+            if reply:
+                self.hits += 1
+        return reply
+
+    def _match(self, text):
+        # Prefer the longest phrase at each position ("thank you" over "thanks"-style overlaps)
+        matches = sorted(self._matcher.find(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        covered, chosen = [False] * len(text), []
+        for start, end, phrase in matches:
+            if not any(covered[start:end]):
+                covered[start:end] = [True] * (end - start)
+                chosen.append(phrase)
+        if not chosen:
+            return None
+        leftover = "".join(" " if covered[i] else char for i, char in enumerate(text)).split()
+        if any(word not in FILLER_WORDS for word in leftover):
+            return None
+        return self._responses[chosen[0]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "phrases": len(self._responses),
+            }
+
+
+small_talk = SmallTalkResponder(casual_responses)
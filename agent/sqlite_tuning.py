@@ -0,0 +1,69 @@
+# agent/sqlite_tuning.py
+"""
+SQLite performance profile.
+
+Applied to every new SQLite connection (``connection_created`` signal, wired
+in AgentConfig.ready when settings.SQLITE_PERFORMANCE_PROFILE is on):
+
+* ``busy_timeout``       wait for the write lock instead of "database is locked";
+                         taken from the database's OPTIONS["timeout"] (seconds)
+                         so the pragma never silently overrides it
+* ``mmap_size``          serve reads from the page cache via mmap
+* ``cache_size`` / ``temp_store`` larger page cache, temp b-trees in memory
+
+With settings.SQLITE_WAL also:
+
+* ``journal_mode=WAL``   readers no longer block the writer and vice versa
+* ``synchronous=NORMAL`` fsync at checkpoints, not every commit (safe in WAL)
+
+WAL is opt-in because it is persistent: the first connection converts the
+database file (header bytes 18/19 go from 1 to 2) and keeps ``-wal``/``-shm``
+files next to it, which would dirty the committed development database.
+Turning it off again needs ``PRAGMA journal_mode=DELETE`` on the file.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSY_TIMEOUT = 5.0  # seconds, when the database sets no OPTIONS["timeout"]
+
+DEFAULT_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -20000,  # negative = KiB, so ~20 MB
+    "temp_store": "MEMORY",
+}
+
+WAL_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+
+
+def sqlite_pragmas(settings_dict=None, wal=None):
+    """
+    Pragmas for one connection; ``settings_dict`` is its DATABASES entry and
+    ``wal`` defaults to settings.SQLITE_WAL.
+    """
+    timeout = ((settings_dict or {}).get("OPTIONS") or {}).get("timeout", DEFAULT_BUSY_TIMEOUT)
+    if wal is None:
+        wal = getattr(settings, "SQLITE_WAL", False)
+    return {
+        **(WAL_PRAGMAS if wal else {}),
+        **DEFAULT_PRAGMAS,
+        "busy_timeout": int(float(timeout) * 1000),  # ms
+        **getattr(settings, "SQLITE_PRAGMAS", {}),
+    }
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` receiver: tune SQLite connections, ignore other vendors."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.settings_dict).items():
+            try:
+                cursor.execute(f"PRAGMA {name} = {value}")
+            except Exception as e:
+                logger.warning(f"Could not set PRAGMA {name}={value}: {str(e)}")
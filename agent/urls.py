@@ -4,7 +4,12 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),  # root of /agent/
     path("chat/", views.chat_api, name="chat_api"),
+    path("chat/stream/", views.chat_stream_api, name="chat_stream_api"),
+    path("chat/async/", views.chat_async_api, name="chat_async_api"),
+    path("history/", views.chat_history_api, name="chat_history_api"),
     path("voice/", views.voice_api, name="voice_api"),
+    path("ready/", views.readiness, name="readiness"),
+    path("metrics/", views.metrics, name="metrics"),
      path('webrtc/agent/', views.webrtc_agent, name='webrtc_agent'),
     path('webrtc/customer/', views.webrtc_customer, name='webrtc_customer'),
     path('api/webrtc/signal/', views.webrtc_signal, name='webrtc_signal'),
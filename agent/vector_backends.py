@@ -0,0 +1,166 @@
+# agent/vector_backends.py
+"""
+Retrieval backends behind the memory_manager product search functions.
+
+``chroma`` queries the persistent Chroma collection (HNSW + SQLite filters).
+``numpy`` answers the same queries by brute force over a float32 embedding
+matrix memory-mapped from disk, with category and price held in plain
+arrays so filters are boolean masks. For a catalog of a few thousand
+products the single matrix-vector product is faster than the HNSW round
+trip and has no per-query SQLite work.
+"""
+import json
+import os
+
+import numpy as np
+
+from agent.catalog_index import product_from_record
+
+
+class ChromaBackend:
+    """Top-k search delegated to a Chroma collection."""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_embedding, n_results=5, category=None, min_price=None, max_price=None):
+        return [product for product, _ in self.query_scored(
+            query_embedding, n_results, category, min_price, max_price
+        )]
+
+    def query_scored(self, query_embedding, n_results=5, category=None, min_price=None, max_price=None):
+        """Like ``query`` but returns ``(product, score)`` pairs; higher scores are closer."""
+        filters = []
+        if category:
+            filters.append({"category": category})
+        if min_price is not None:
+            filters.append({"price": {"$gte": min_price}})
+        if max_price is not None:
+            filters.append({"price": {"$lte": max_price}})
+        if not filters:
+            where = None
+        elif len(filters) == 1:
+            where = filters[0]
+        else:
+            where = {"$and": filters}
+
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results["documents"] or not results["documents"][0]:
+            return []
+        return [
+            (product_from_record(doc, metadata), -float(distance))
+            for doc, metadata, distance in zip(
+                results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+
+class NumpyBackend:
+    """Brute-force cosine search over a memory-mapped, L2-normalised float32 matrix."""
+
+    name = "numpy"
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.vectors = np.load(self.path + ".npy", mmap_mode="r")
+        with open(self.path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.ids = meta["ids"]
+        self.products = [
+            product_from_record(doc, metadata)
+            for doc, metadata in zip(meta["documents"], meta["metadatas"])
+        ]
+        self.category_names = sorted({p["category"] for p in self.products})
+        category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self.category_codes = np.array(
+            [category_codes[p["category"]] for p in self.products], dtype=np.int32
+        )
+        self.prices = np.array([float(p["price"]) for p in self.products], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.products)
+
+    def _mask(self, category=None, min_price=None, max_price=None):
+        mask = None
+        if category:
+            if category not in self.category_names:
+                return np.zeros(len(self.products), dtype=bool)
+            mask = self.category_codes == self.category_names.index(category)
+        if min_price is not None:
+            in_range = self.prices >= float(min_price)
+            mask = in_range if mask is None else mask & in_range
+        if max_price is not None:
+            in_range = self.prices <= float(max_price)
+            mask = in_range if mask is None else mask & in_range
+        return mask
+
+    def query(self, query_embedding, n_results=5, category=None, min_price=None, max_price=None):
+        return [product for product, _ in self.query_scored(
+            query_embedding, n_results, category, min_price, max_price
+        )]
+
+    def query_scored(self, query_embedding, n_results=5, category=None, min_price=None, max_price=None):
+        """Like ``query`` but returns ``(product, cosine similarity)`` pairs."""
+        if not self.products:
+            return []
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+        scores = self.vectors @ query_vec
+
+        mask = self._mask(category, min_price, max_price)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            n_results = min(n_results, int(mask.sum()))
+        n_results = min(n_results, len(scores))
+        if n_results <= 0:
+            return []
+
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        return [(self.products[i], float(scores[i])) for i in top]
+
+
+def export_numpy_index(collection, path):
+    """Write the collection's embeddings and metadata to ``path``.npy / ``path``.json."""
+    results = collection.get(include=["embeddings", "documents", "metadatas"])
+    embeddings = results["embeddings"]
+    if embeddings is None or len(embeddings) == 0:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    else:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = np.ascontiguousarray(vectors / norms)
+
+    path = str(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to temporary files first so a running worker never maps a half-written matrix
+    np.save(path + ".tmp.npy", vectors)
+    with open(path + ".tmp.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "ids": list(results["ids"]),
+            "documents": list(results["documents"]),
+            "metadatas": list(results["metadatas"]),
+        }, f)
+    os.replace(path + ".tmp.npy", path + ".npy")
+    os.replace(path + ".tmp.json", path + ".json")
+    return len(results["ids"])
+
+
+def create_backend(name, collection, numpy_path=None):
+    """Instantiate the backend named by the PRODUCT_SEARCH_BACKEND setting."""
+    if name == "chroma":
+        return ChromaBackend(collection)
+    if name == "numpy":
+        if not os.path.exists(str(numpy_path) + ".npy"):
+            export_numpy_index(collection, numpy_path)
+        return NumpyBackend(numpy_path)
+    raise ValueError(f"Unknown product search backend: {name!r}")
@@ -1,31 +1,42 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import close_old_connections
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
 from .voice_utils import text_to_speech, speech_to_text
-from agent.casual_responses import casual_responses
 from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv()
 import pytz
-import re
 import os
 import json
+import hashlib
 import tempfile
 import base64
-import requests
+import asyncio
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from agent.memory_service import save_message, get_history
+from agent.memory_service import (
+    save_message, get_history, get_messages_after, get_history_page, latest_message_id, writer_stats,
+)
+from agent import history_cache
+from agent.warmup import is_ready, warmup_state
+from agent.llm_client import get_llm_client, LLMError
+from agent.response_cache import cache_probe, remember_reply, response_cache
+from agent.small_talk import small_talk
+from agent.prompt_budget import assemble_messages
+from agent.conversation_summary import get_summary, schedule_summary_refresh, summary_worker
 from agent.prompts import SALES_CHATBOT_PROMPT
 
 # Import ChromaDB product search functions
-from agent.memory_manager import (
-    search_products,
-    get_product_by_category,
-    get_all_categories,
-    get_products_in_price_range,
-)
+from agent.memory_manager import get_all_categories
+from agent.catalog_sync import sync_stats as catalog_sync_stats
+from agent.query_planner import plan_query, execute_plan
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -34,55 +45,92 @@ logger = logging.getLogger(__name__)
 PAKISTAN_TZ = pytz.timezone("Asia/Karachi")
 
 # Get API key from environment variables (more secure)
-GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
 def index(request):
     return render(request, "index.html")
 
+@require_http_methods(["GET"])
+def readiness(request):
+    """
+    Readiness probe: 200 once warm-up has finished on this worker, 503 until
+    then. Always 200 when startup warm-up is off (AGENT_WARMUP_ON_STARTUP).
+    """
+    state = warmup_state()
+    ready = is_ready()
+    return JsonResponse(
+        {"ready": ready, **state, "llm_client": get_llm_client().metrics()},
+        status=200 if ready else 503,
+    )
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Runtime counters for the LLM client and the response caches on this worker."""
+    return JsonResponse(
+        {
+            "llm_client": get_llm_client().metrics(),
+            "response_cache": response_cache.stats(),
+            "small_talk": small_talk.stats(),
+            "summary_worker": summary_worker.stats(),
+            "chat_log_writer": writer_stats(),
+            "history_cache": history_cache.stats(),
+            "catalog_sync": catalog_sync_stats(),
+        }
+    )
+
+def _history_page_etag(request):
+    session_id = request.GET.get("session_id")
+    if not session_id:
+        return None
+    key = f"{request.GET.get('before', '')}:{request.GET.get('limit', '')}:{latest_message_id(session_id)}"
+    return history_etag(session_id, key)
+
+@require_http_methods(["GET"])
+@condition(etag_func=_history_page_etag)
+def chat_history_api(request):
+    """
+    Paginated history for the initial page load.
+
+    GET ?session_id=...&before=<message id>&limit=50 returns the page of
+    messages just before ``before`` (the newest page when omitted), oldest
+    first, plus ``next_before`` for the following page and ``cursor`` (the
+    newest message id) to send as ``last_seen_id`` on later chat turns.
+    Honours If-None-Match with 304.
+    """
+    session_id = request.GET.get("session_id")
+    if not session_id:
+        return JsonResponse({"error": "session_id is required"}, status=400)
+    try:
+        before = int(request.GET["before"]) if request.GET.get("before") else None
+        limit = min(int(request.GET.get("limit", 50)), 200)
+    except ValueError:
+        return JsonResponse({"error": "before and limit must be integers"}, status=400)
+
+    messages, has_more = get_history_page(session_id, before_id=before, limit=max(limit, 1))
+    return JsonResponse(
+        {
+            "messages": [serialize_message(h) for h in messages],
+            "has_more": has_more,
+            "next_before": messages[0].id if has_more and messages else None,
+            "cursor": latest_message_id(session_id),
+        }
+    )
+
 def extract_intent_and_search(user_message):
     """
     Dynamically analyze user message and search for relevant products.
     Returns formatted product information based on the query.
     """
     try:
-        message_lower = user_message.lower()
+        # 1. Parse intents, then run one filtered retrieval
+        plan = plan_query(user_message)
+        search_results = execute_plan(plan, n_results=5)
 
-        # 1. Search ChromaDB for relevant products
-        search_results = search_products(user_message, n_results=5)
-
-        # 2. Category detection
-        categories = get_all_categories()
-        for category in categories:
-            if category.lower() in message_lower or category.lower().rstrip("s") in message_lower:
-                category_results = get_product_by_category(category, n_results=6)
-                if category_results:
-                    search_results = category_results
-                    break
-
-        # 3. Price-related queries
-        price_pattern = r"\$?(\d+)(?:\s*(?:to|-)?\s*\$?(\d+))?"
-        price_match = re.search(price_pattern, user_message)
-        if price_match and (
-            "budget" in message_lower
-            or "price" in message_lower
-            or "under" in message_lower
-            or "between" in message_lower
-        ):
-            min_price = int(price_match.group(1))
-            max_price = int(price_match.group(2)) if price_match.group(2) else min_price + 500
-            if "under" in message_lower:
-                max_price = min_price
-                min_price = 0
-
-            price_results = get_products_in_price_range(min_price, max_price, n_results=5)
-            if price_results:
-                search_results = price_results
-
-        # 4. Format results
+        # 2. Format results
         if search_results:
-            products_context = ""
+            # One block per product so the prompt assembler can drop whole products
+            context_blocks = []
             for i, product in enumerate(search_results[:5], 1):
-                products_context += f"\n{i}. {product['name']} ({product['category']}) - ${product['price']}"
+                block = f"\n{i}. {product['name']} ({product['category']}) - ${product['price']}"
                 desc = product.get("description", "")
                 if desc:
                     key_info = (
@@ -91,11 +139,13 @@ def extract_intent_and_search(user_message):
                         .replace("Model:", "")
                         .replace("Price:", "")
                     )
-                    products_context += f"\n   {key_info[:150]}..."
+                    block += f"\n   {key_info[:150]}..."
+                context_blocks.append(block)
 
             return {
                 "found_products": True,
-                "products_context": products_context,
+                "products_context": "".join(context_blocks),
+                "context_blocks": context_blocks,
                 "product_count": len(search_results),
                 "products_data": search_results,
             }
@@ -155,226 +205,597 @@ Your job:
 
 def call_groq_api(messages):
     """
-    Separate function to handle GROQ API calls with better error handling
+    Get a chat completion through the shared pooled LLM client.
+    Returns (reply_text, None) or (None, error_message).
+    """
+    try:
+        logger.info(f"Making API call to GROQ with {len(messages)} messages")
+        return get_llm_client().complete(messages), None
+    except LLMError as e:
+        return None, str(e)
+    except Exception as e:
+        logger.error(f"Unexpected error in GROQ API call: {str(e)}")
+        return None, f"API error: {str(e)}"
+
+def stream_groq_api(messages):
+    """
+    Streaming variant of call_groq_api. Yields content deltas as they arrive;
+    raises LLMError (a RuntimeError) if the request fails.
+    """
+    logger.info(f"Making streaming API call to GROQ with {len(messages)} messages")
+    yield from get_llm_client().stream(messages)
+
+async def async_stream_groq_api(messages):
+    """Async counterpart of stream_groq_api, for ASGI streaming responses."""
+    logger.info(f"Making async streaming API call to GROQ with {len(messages)} messages")
+    async for token in get_llm_client().astream(messages):
+        yield token
+
+def parse_chat_request(request):
+    """
+    Validate a JSON chat request.
+    Returns (user_message, session_id, None) or (None, None, error JsonResponse).
     """
-    if not GROQ_API_KEY:
-        logger.error("GROQ_API_KEY is not set in environment variables")
-        return None, "API key not configured. Please set GROQ_API_KEY environment variable."
+    if request.content_type != 'application/json':
+        logger.warning(f"Invalid content type: {request.content_type}")
+        return None, None, JsonResponse({"error": "Content-Type must be application/json"}, status=400)
 
     try:
-        # Validate messages format
-        if not isinstance(messages, list) or not messages:
-            logger.error("Invalid messages format")
-            return None, "Invalid message format"
-
-        payload = {
-            "model": "llama-3.3-70b-versatile",
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 800,
-        }
+        data = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {str(e)}")
+        return None, None, JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except UnicodeDecodeError as e:
+        logger.error(f"Unicode decode error: {str(e)}")
+        return None, None, JsonResponse({"error": "Invalid character encoding"}, status=400)
+
+    user_message = data.get("message", "").strip()
+    session_id = data.get("session_id", "default")
+
+    if not user_message:
+        return None, None, JsonResponse({"error": "Message field is required and cannot be empty"}, status=400)
+
+    if len(user_message) > 1000:  # Add reasonable length limit
+        return None, None, JsonResponse({"error": "Message too long (max 1000 characters)"}, status=400)
+
+    return user_message, session_id, None
+
+def parse_last_seen_id(request):
+    """The ``last_seen_id`` history cursor from a chat request body, or None."""
+    try:
+        value = json.loads(request.body.decode("utf-8")).get("last_seen_id")
+        return int(value) if value is not None else None
+    except (ValueError, TypeError, UnicodeDecodeError, AttributeError):
+        return None
+
+def serialize_message(h):
+    return {
+        "id": h.id,
+        "sender": h.sender,
+        "message": h.message,
+        "timestamp": h.timestamp.astimezone(PAKISTAN_TZ).strftime("%d-%m-%Y %I:%M:%S %p"),
+    }
+
+def history_delta(session_id, last_seen_id=None):
+    """
+    History for a chat response: with a ``last_seen_id`` cursor only the newer
+    stored rows, without one the last 50 (older clients). Returns (rows, new_cursor).
+    """
+    if last_seen_id is None:
+        rows = get_history(session_id, limit=50)
+    else:
+        rows = get_messages_after(session_id, last_seen_id, limit=getattr(settings, "HISTORY_DELTA_LIMIT", 50))
+    cursor = max((h.id for h in rows if h.id is not None), default=last_seen_id or 0)
+    return [serialize_message(h) for h in rows], cursor
+
+def history_etag(session_id, cursor):
+    """Strong ETag for a session's history as of message ``cursor``."""
+    return '"' + hashlib.sha1(f"{session_id}:{cursor}".encode("utf-8")).hexdigest()[:20] + '"'
+
+def prepare_chat_turn(session_id, user_message):
+    """
+    Persist the user message, load history, search products and build the
+    LLM messages. Returns (messages, products_info, prompt_stats).
+    """
+    # Save user message
+    try:
+        save_message(session_id, "user", user_message)
+    except Exception as e:
+        logger.error(f"Error saving user message: {str(e)}")
+        # Continue processing even if saving fails
+
+    # Get conversation summary and the recent messages it doesn't cover
+    try:
+        history, summary = load_conversation(session_id)
+    except Exception as e:
+        logger.error(f"Error getting history: {str(e)}")
+        history, summary = [], ""
+
+    # Product search
+    products_info = extract_intent_and_search(user_message)
+    logger.info(f"Product search found {products_info['product_count']} products")
+
+    messages, prompt_stats = build_chat_messages(history, user_message, products_info, summary)
+    return messages, products_info, prompt_stats
+
+def load_conversation(session_id):
+    """Rolling summary of the session plus the recent messages it doesn't cover yet."""
+    summary, summarized_until = get_summary(session_id)
+    # Queued (not yet written) messages have no id and are never summarized yet
+    history = [h for h in get_history(session_id, limit=10) if h.id is None or h.id > summarized_until]
+    return history, summary
+
+def build_chat_messages(history, user_message, products_info, summary=""):
+    """
+    Fit system prompt, conversation summary, product context and recent
+    history into the input token budget. ``history`` is the ChatMessage list
+    ending with the just-saved user message. Returns (messages, prompt_stats).
+    """
+    turns = [("assistant" if h.sender == "agent" else "user", h.message) for h in history]
+    if turns and turns[-1] == ("user", user_message):
+        turns.pop()  # the current message is appended last by the assembler
+    messages, prompt_stats = assemble_messages(
+        create_dynamic_system_prompt,
+        products_info,
+        turns,
+        user_message,
+        summary=summary,
+        max_input_tokens=getattr(settings, "PROMPT_MAX_INPUT_TOKENS", 3000),
+        max_turn_tokens=getattr(settings, "PROMPT_MAX_TURN_TOKENS", 300),
+        max_product_tokens=getattr(settings, "PROMPT_MAX_PRODUCT_TOKENS", 1200),
+    )
+    prompt_stats["first_turn"] = not turns and not summary
+    logger.info(f"Prompt assembled: {prompt_stats['prompt_tokens']} tokens, "
+                f"{prompt_stats['history_turns']} history turns")
+    return messages, prompt_stats
 
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}", 
-            "Content-Type": "application/json"
+def cache_status(probe):
+    if probe is None:
+        return "skipped"
+    return "hit" if probe["hit"] else "miss"
+
+def small_talk_turn(session_id, user_message):
+    """
+    Answer a pure greeting/thanks from casual_responses, skipping product search
+    and the LLM. Saves the user message; returns (reply_text, products_info,
+    lead_stage, emotion, api_info), or None when the message needs the full pipeline.
+    """
+    reply_text = small_talk.reply(user_message)
+    if not reply_text:
+        return None
+    try:
+        save_message(session_id, "user", user_message)
+    except Exception as e:
+        logger.error(f"Error saving user message: {str(e)}")
+    products_info = {"found_products": False, "products_context": "", "product_count": 0, "products_data": []}
+    api_info = {"api_used": False, "api_error": None, "response_cache": "skipped", "small_talk": True}
+    return (reply_text, products_info, *classify_lead(products_info), api_info)
+
+def generate_reply(user_message, messages, products_info, prompt_stats):
+    """
+    Reply for a prepared turn: from the semantic response cache when a
+    near-duplicate context-free question was answered before, else from the
+    LLM, else the product-list fallback.
+    Returns (reply_text, lead_stage, emotion, api_info) for debug_info.
+    """
+    probe = cache_probe(user_message, products_info, prompt_stats["first_turn"])
+    if probe and probe["hit"]:
+        hit = probe["hit"]
+        api_info = {
+            "api_used": False,
+            "api_error": None,
+            "response_cache": "hit",
+            "small_talk": False,
+            "prompt": prompt_stats,
         }
+        return hit["reply"], hit["lead_stage"], hit["emotion"], api_info
 
-        logger.info(f"Making API call to GROQ with {len(messages)} messages")
-        
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions", 
-            headers=headers, 
-            json=payload, 
-            timeout=30
-        )
+    start = time.perf_counter()
+    api_response, error = call_groq_api(messages)
+    api_info = {
+        "api_used": api_response is not None,
+        "api_error": error,
+        "response_cache": cache_status(probe),
+        "small_talk": False,
+        "prompt": prompt_stats,
+    }
 
-        logger.info(f"GROQ API Response Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            try:
-                resp_json = response.json()
-                if "choices" in resp_json and len(resp_json["choices"]) > 0:
-                    reply_text = resp_json["choices"][0]["message"]["content"].strip()
-                    logger.info("Successfully got response from GROQ API")
-                    return reply_text, None
-                else:
-                    logger.error(f"Invalid response format: {resp_json}")
-                    return None, "Invalid API response format"
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}")
-                return None, "Failed to parse API response"
-        elif response.status_code == 401:
-            logger.error(f"API Authentication Error: {response.text}")
-            return None, "Invalid API key. Please check your GROQ_API_KEY."
-        elif response.status_code == 429:
-            logger.error(f"API Rate limit exceeded: {response.text}")
-            return None, "Rate limit exceeded. Please try again later."
+    if api_response:
+        lead_stage, emotion = classify_lead(products_info)
+        remember_reply(probe, api_response, lead_stage, emotion, time.perf_counter() - start)
+        return api_response, lead_stage, emotion, api_info
+
+    # Fallback response when API fails
+    logger.warning(f"API failed: {error}. Using fallback response.")
+    return (*fallback_reply(products_info), api_info)
+
+def classify_lead(products_info):
+    """Lead stage and emotion for a successful LLM reply."""
+    if products_info["found_products"]:
+        if products_info["product_count"] == 1:
+            return "hot", "helpful"
+        elif products_info["product_count"] <= 3:
+            return "warm", "helpful"
+        return "interested", "helpful"
+    return "curious", "friendly"
+
+def fallback_reply(products_info):
+    """Reply, lead stage and emotion used when the LLM API is unavailable."""
+    if products_info["found_products"]:
+        product_list = [
+            f"• {p['name']} - ${p['price']} ({p['category']})" 
+            for p in products_info["products_data"][:3]
+        ]
+        reply_text = "I found some great options for  you:\n\n" + "\n".join(product_list)
+        reply_text += "\n\nWould you like more details about any of these products?"
+        return reply_text, "warm", "helpful"
+
+    try:
+        categories = get_all_categories()
+        if categories:
+            reply_text = f"I can help you find tech products! We have items in these categories: {', '.join(categories)}. What specifically are you looking for?"
         else:
-            logger.error(f"API Error: {response.status_code} - {response.text}")
-            return None, f"API returned status {response.status_code}"
-
-    except requests.exceptions.Timeout:
-        logger.error("GROQ API timeout")
-        return None, "API timeout - please try again"
-    except requests.exceptions.ConnectionError:
-        logger.error("GROQ API connection error")
-        return None, "Connection error - please check your internet connection"
+            reply_text = "I'm here to help you find the perfect tech products! What are you looking for today?"
     except Exception as e:
-        logger.error(f"Unexpected error in GROQ API call: {str(e)}")
-        return None, f"API error: {str(e)}"
+        logger.error(f"Error getting categories for fallback: {str(e)}")
+        reply_text = "I'm here to help you find the perfect tech products! What are you looking for today?"
+    return reply_text, "cold", "neutral"
 
 @csrf_exempt
 @require_http_methods(["POST"])
 def chat_api(request):
     try:
-        # Validate content type
-        if request.content_type != 'application/json':
-            logger.warning(f"Invalid content type: {request.content_type}")
-            return JsonResponse({"error": "Content-Type must be application/json"}, status=400)
-
-        # Parse JSON body
-        try:
-            data = json.loads(request.body.decode("utf-8"))
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
-            return JsonResponse({"error": "Invalid JSON format"}, status=400)
-        except UnicodeDecodeError as e:
-            logger.error(f"Unicode decode error: {str(e)}")
-            return JsonResponse({"error": "Invalid character encoding"}, status=400)
-
-        # Validate required fields
-        user_message = data.get("message", "").strip()
-        session_id = data.get("session_id", "default")
-
-        if not user_message:
-            return JsonResponse({"error": "Message field is required and cannot be empty"}, status=400)
-
-        if len(user_message) > 1000:  # Add reasonable length limit
-            return JsonResponse({"error": "Message too long (max 1000 characters)"}, status=400)
+        user_message, session_id, error_response = parse_chat_request(request)
+        if error_response:
+            return error_response
 
         logger.info(f"Processing message from session {session_id}: {user_message[:50]}...")
 
-        # Save user message
+        small_talk_result = small_talk_turn(session_id, user_message)
+        if small_talk_result:
+            reply_text, products_info, lead_stage, emotion, api_info = small_talk_result
+        else:
+            messages, products_info, prompt_stats = prepare_chat_turn(session_id, user_message)
+            reply_text, lead_stage, emotion, api_info = generate_reply(
+                user_message, messages, products_info, prompt_stats
+            )
+
+        # Save agent response
         try:
-            save_message(session_id, "user", user_message)
+            save_message(session_id, "agent", reply_text)
+            schedule_summary_refresh(session_id)
         except Exception as e:
-            logger.error(f"Error saving user message: {str(e)}")
-            # Continue processing even if saving fails
+            logger.error(f"Error saving agent response: {str(e)}")
+            # Continue even if saving fails
 
-        # Get conversation history
+        # Only the rows the client hasn't seen yet
         try:
-            history = get_history(session_id, limit=10)
+            history_data, cursor = history_delta(session_id, parse_last_seen_id(request))
         except Exception as e:
-            logger.error(f"Error getting history: {str(e)}")
-            history = []
+            logger.error(f"Error formatting history: {str(e)}")
+            history_data, cursor = [], None
 
-        # Product search
-        products_info = extract_intent_and_search(user_message)
-        logger.info(f"Product search found {products_info['product_count']} products")
+        response = JsonResponse(
+            {
+                "reply": reply_text,
+                "lead_stage": lead_stage,
+                "emotion": emotion,
+                "history": history_data,
+                "history_cursor": cursor,
+                "debug_info": {
+                    "products_found": products_info["product_count"],
+                    "search_successful": products_info["found_products"],
+                    **api_info,
+                    "llm_circuit": get_llm_client().breaker_state(),
+                },
+            }
+        )
+        if cursor is not None:
+            response["ETag"] = history_etag(session_id, cursor)
+        return response
+
+    except Exception as e:
+        logger.error(f"Unexpected error in chat_api: {str(e)}")
+        return JsonResponse({"error": "Internal server error"}, status=500)
 
-        # Initialize defaults
-        reply_text = "I'm having trouble processing your request right now. Please try again."
-        lead_stage = "cold"
-        emotion = "neutral"
+def _sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
 
-        # System prompt with product context
-        system_prompt = create_dynamic_system_prompt(products_info)
+def _stream_cursor(session_id):
+    # Newest message id, for the client's next last_seen_id
+    try:
+        return latest_message_id(session_id)
+    except Exception as e:
+        logger.error(f"Error reading history cursor: {str(e)}")
+        return None
 
-        # Convert history into proper messages
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        try:
-            for h in history:
-                role = "assistant" if h.sender == "agent" else "user"
-                messages.append({"role": role, "content": h.message})
-        except Exception as e:
-            logger.error(f"Error processing history: {str(e)}")
-            # Continue with just system prompt and current message
+def stream_turn_start(session_id, user_message):
+    """
+    The part of a streamed turn before the first LLM token: small talk,
+    retrieval, prompt assembly and the response-cache probe. Returns a dict
+    that stream_turn_finish completes; ``messages`` is set when the reply
+    should be streamed from the LLM.
+    """
+    turn = {
+        "small_talk": small_talk_turn(session_id, user_message),
+        "messages": None,
+        "products_info": {"found_products": False, "products_context": "", "product_count": 0, "products_data": []},
+        "prompt_stats": None,
+        "probe": None,
+        "error": None,
+    }
+    if turn["small_talk"]:
+        return turn
+    try:
+        messages, products_info, prompt_stats = prepare_chat_turn(session_id, user_message)
+        turn.update(products_info=products_info, prompt_stats=prompt_stats)
+        turn["probe"] = cache_probe(user_message, products_info, prompt_stats["first_turn"])
+        if not (turn["probe"] and turn["probe"]["hit"]):
+            turn["messages"] = messages
+    except Exception as e:
+        turn["error"] = str(e)
+        logger.error(f"Streaming API call failed: {turn['error']}")
+    return turn
 
-        # Append current user input
-        messages.append({"role": "user", "content": user_message})
+def stream_turn_finish(session_id, turn, parts, completed, llm_seconds):
+    """
+    Settle the reply once streaming is over (cached, streamed, or fallback),
+    save it, and return the SSE events still to be sent.
+    """
+    events = []
+    if turn["small_talk"]:
+        reply_text, products_info, lead_stage, emotion, api_info = turn["small_talk"]
+        events.append(_sse_event({"token": reply_text}))
+        debug_info = {"products_found": 0, "search_successful": False, **api_info}
+    else:
+        probe, products_info = turn["probe"], turn["products_info"]
+        if probe and probe["hit"]:
+            hit = probe["hit"]
+            reply_text, lead_stage, emotion = hit["reply"], hit["lead_stage"], hit["emotion"]
+            events.append(_sse_event({"token": reply_text}))
+        elif parts:
+            # A stream cut short still stands as the reply the customer saw, but is never cached
+            reply_text = "".join(parts).strip()
+            lead_stage, emotion = classify_lead(products_info)
+            if completed:
+                remember_reply(probe, reply_text, lead_stage, emotion, llm_seconds)
+        else:
+            logger.warning(f"API failed: {turn['error']}. Using fallback response.")
+            reply_text, lead_stage, emotion = fallback_reply(products_info)
+            events.append(_sse_event({"token": reply_text}))
+        debug_info = {
+            "products_found": products_info["product_count"],
+            "search_successful": products_info["found_products"],
+            "api_used": completed,
+            "stream_interrupted": bool(parts) and not completed,
+            "api_error": turn["error"],
+            "response_cache": cache_status(probe),
+            "small_talk": False,
+            "prompt": turn["prompt_stats"],
+            "llm_circuit": get_llm_client().breaker_state(),
+        }
+
+    try:
+        save_message(session_id, "agent", reply_text)
+        schedule_summary_refresh(session_id)
+    except Exception as e:
+        logger.error(f"Error saving agent response: {str(e)}")
 
-        # Call GROQ API
-        api_response, error = call_groq_api(messages)
+    events.append(_sse_event(
+        {
+            "reply": reply_text,
+            "lead_stage": lead_stage,
+            "emotion": emotion,
+            "history_cursor": _stream_cursor(session_id),
+            "debug_info": debug_info,
+        },
+        event="done",
+    ))
+    return events
 
-        if api_response:
-            reply_text = api_response
-            
-            # Lead stage logic
-            if products_info["found_products"]:
-                if products_info["product_count"] == 1:
-                    lead_stage = "hot"
-                elif products_info["product_count"] <= 3:
-                    lead_stage = "warm"
-                else:
-                    lead_stage = "interested"
-                emotion = "helpful"
-            else:
-                lead_stage = "curious"
-                emotion = "friendly"
+@csrf_exempt
+@require_http_methods(["POST"])
+def chat_stream_api(request):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+
+    Emits one ``data: {"token": ...}`` event per LLM delta, then a trailing
+    ``event: done`` carrying the full reply, ``lead_stage``, ``emotion`` and
+    ``history_cursor`` (newest message id, the next ``last_seen_id``).
+    The agent reply is saved once the stream has finished.
+
+    Under ASGI the response iterates an async generator: Django buffers a
+    sync iterator in full there, which would hold every token until the end.
+    """
+    user_message, session_id, error_response = parse_chat_request(request)
+    if error_response:
+        return error_response
+
+    logger.info(f"Streaming reply for session {session_id}: {user_message[:50]}...")
+
+    def event_stream():
+        turn = stream_turn_start(session_id, user_message)
+        parts, completed = [], False
+        start = time.perf_counter()
+        if turn["messages"] is not None:
+            try:
+                for token in stream_groq_api(turn["messages"]):
+                    parts.append(token)
+                    yield _sse_event({"token": token})
+                completed = True
+            except Exception as e:
+                turn["error"] = str(e)
+                logger.error(f"Streaming API call failed: {turn['error']}")
+        yield from stream_turn_finish(session_id, turn, parts, completed, time.perf_counter() - start)
+
+    async def async_event_stream():
+        turn = await sync_to_async(stream_turn_start)(session_id, user_message)
+        parts, completed = [], False
+        start = time.perf_counter()
+        if turn["messages"] is not None:
+            try:
+                async for token in async_stream_groq_api(turn["messages"]):
+                    parts.append(token)
+                    yield _sse_event({"token": token})
+                completed = True
+            except Exception as e:
+                turn["error"] = str(e)
+                logger.error(f"Streaming API call failed: {turn['error']}")
+        events = await sync_to_async(stream_turn_finish)(
+            session_id, turn, parts, completed, time.perf_counter() - start
+        )
+        for event in events:
+            yield event
+
+    stream = async_event_stream() if isinstance(request, ASGIRequest) else event_stream()
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+# ---- Async chat pipeline (served through website_sale_agent/asgi.py) ----
+# CPU-bound retrieval (query embedding, vector search) runs on a bounded pool so a
+# burst of turns can't spawn unbounded threads or starve the event loop.
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "CHAT_RETRIEVAL_WORKERS", 4),
+    thread_name_prefix="chat-retrieval",
+)
+
+async def async_call_groq_api(messages):
+    """Async counterpart of call_groq_api; returns (reply_text, error)."""
+    try:
+        logger.info(f"Making async API call to GROQ with {len(messages)} messages")
+        return await get_llm_client().acomplete(messages), None
+    except LLMError as e:
+        return None, str(e)
+    except Exception as e:
+        logger.error(f"Unexpected error in async GROQ API call: {str(e)}")
+        return None, f"API error: {str(e)}"
+
+def _run_and_release_connection(fn, *args):
+    """Run ``fn`` on an executor thread and drop that thread's stale DB connections."""
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+async def _save_and_load_history(session_id, user_message):
+    try:
+        await sync_to_async(save_message)(session_id, "user", user_message)
+    except Exception as e:
+        logger.error(f"Error saving user message: {str(e)}")
+    try:
+        return await sync_to_async(load_conversation)(session_id)
+    except Exception as e:
+        logger.error(f"Error getting history: {str(e)}")
+        return [], ""
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def chat_async_api(request):
+    """
+    Async version of chat_api for ASGI workers.
+
+    History loading and product retrieval run concurrently, retrieval on the
+    bounded executor, and the Groq call uses a non-blocking HTTP client, so a
+    worker holds many in-flight conversations instead of one per thread.
+    """
+    try:
+        user_message, session_id, error_response = parse_chat_request(request)
+        if error_response:
+            return error_response
+        last_seen_id = parse_last_seen_id(request)
+
+        logger.info(f"Processing async message from session {session_id}: {user_message[:50]}...")
+
+        small_talk_result = await sync_to_async(small_talk_turn)(session_id, user_message)
+        if small_talk_result:
+            reply_text, products_info, lead_stage, emotion, api_info = small_talk_result
+            await sync_to_async(save_message)(session_id, "agent", reply_text)
+            schedule_summary_refresh(session_id)
+            history_data, cursor = await sync_to_async(history_delta)(session_id, last_seen_id)
+            return JsonResponse(
+                {
+                    "reply": reply_text,
+                    "lead_stage": lead_stage,
+                    "emotion": emotion,
+                    "history": history_data,
+                    "history_cursor": cursor,
+                    "debug_info": {"products_found": 0, "search_successful": False, **api_info},
+                }
+            )
+
+        loop = asyncio.get_running_loop()
+        (history, summary), products_info = await asyncio.gather(
+            _save_and_load_history(session_id, user_message),
+            loop.run_in_executor(
+                _retrieval_executor, _run_and_release_connection, extract_intent_and_search, user_message
+            ),
+        )
+        logger.info(f"Product search found {products_info['product_count']} products")
+
+        messages, prompt_stats = await loop.run_in_executor(
+            _retrieval_executor, build_chat_messages, history, user_message, products_info, summary
+        )
+
+        probe = await loop.run_in_executor(
+            _retrieval_executor, cache_probe, user_message, products_info, prompt_stats["first_turn"]
+        )
+        api_response, error = None, None
+        if probe and probe["hit"]:
+            hit = probe["hit"]
+            reply_text, lead_stage, emotion = hit["reply"], hit["lead_stage"], hit["emotion"]
         else:
-            # Fallback response when API fails
-            logger.warning(f"API failed: {error}. Using fallback response.")
-            
-            if products_info["found_products"]:
-                product_list = [
-                    f"• {p['name']} - ${p['price']} ({p['category']})" 
-                    for p in products_info["products_data"][:3]
-                ]
-                reply_text = "I found some great options for  you:\n\n" + "\n".join(product_list)
-                reply_text += "\n\nWould you like more details about any of these products?"
-                lead_stage = "warm"
-                emotion = "helpful"
+            start = time.perf_counter()
+            api_response, error = await async_call_groq_api(messages)
+            if api_response:
+                reply_text = api_response
+                lead_stage, emotion = classify_lead(products_info)
+                remember_reply(probe, reply_text, lead_stage, emotion, time.perf_counter() - start)
             else:
-                try:
-                    categories = get_all_categories()
-                    if categories:
-                        reply_text = f"I can help you find tech products! We have items in these categories: {', '.join(categories)}. What specifically are you looking for?"
-                    else:
-                        reply_text = "I'm here to help you find the perfect tech products! What are you looking for today?"
-                except Exception as e:
-                    logger.error(f"Error getting categories for fallback: {str(e)}")
-                    reply_text = "I'm here to help you find the perfect tech products! What are you looking for today?"
+                logger.warning(f"API failed: {error}. Using fallback response.")
+                reply_text, lead_stage, emotion = await loop.run_in_executor(
+                    _retrieval_executor, fallback_reply, products_info
+                )
 
-        # Save agent response
         try:
-            save_message(session_id, "agent", reply_text)
+            await sync_to_async(save_message)(session_id, "agent", reply_text)
+            schedule_summary_refresh(session_id)
         except Exception as e:
             logger.error(f"Error saving agent response: {str(e)}")
-            # Continue even if saving fails
 
-        # Updated history
         try:
-            history = get_history(session_id, limit=50)
-            history_data = [
-                {
-                    "sender": h.sender,
-                    "message": h.message,
-                    "timestamp": h.timestamp.astimezone(PAKISTAN_TZ).strftime("%d-%m-%Y %I:%M:%S %p"),
-                }
-                for h in history
-            ]
+            history_data, cursor = await sync_to_async(history_delta)(session_id, last_seen_id)
         except Exception as e:
             logger.error(f"Error formatting history: {str(e)}")
-            history_data = []
+            history_data, cursor = [], None
 
-        return JsonResponse(
+        response = JsonResponse(
             {
                 "reply": reply_text,
                 "lead_stage": lead_stage,
                 "emotion": emotion,
                 "history": history_data,
+                "history_cursor": cursor,
                 "debug_info": {
                     "products_found": products_info["product_count"],
                     "search_successful": products_info["found_products"],
                     "api_used": api_response is not None,
                     "api_error": error if error else None,
+                    "response_cache": cache_status(probe),
+                    "small_talk": False,
+                    "prompt": prompt_stats,
+                    "llm_circuit": get_llm_client().breaker_state(),
                 },
             }
         )
+        if cursor is not None:
+            response["ETag"] = history_etag(session_id, cursor)
+        return response
 
     except Exception as e:
-        logger.error(f"Unexpected error in chat_api: {str(e)}")
+        logger.error(f"Unexpected error in chat_async_api: {str(e)}")
         return JsonResponse({"error": "Internal server error"}, status=500)
 
 @csrf_exempt
@@ -552,33 +973,25 @@ def webrtc_process_audio(request):
             if "STT service failed" in user_text or "could not understand" in user_text:
                 return JsonResponse({"error": user_text}, status=400)
             
-            # 2. Save user message
-            save_message(session_id, "user", user_text)
-            
-            # 3. Get conversation history
-            history = get_history(session_id, limit=10)
-            
-            # 4. Search for products
-            products_info = extract_intent_and_search(user_text)
-            
-            # 5. Create system prompt
-            system_prompt = create_dynamic_system_prompt(products_info)
-            
-            # 6. Build messages for AI
-            messages = [{"role": "system", "content": system_prompt}]
-            for h in history:
-                role = "assistant" if h.sender == "agent" else "user"
-                messages.append({"role": role, "content": h.message})
-            messages.append({"role": "user", "content": user_text})
-            
-            # 7. Get AI response
-            ai_response, error = call_groq_api(messages)
+            small_talk_result = small_talk_turn(session_id, user_text)
+            if small_talk_result:
+                # Greeting/thanks: canned reply, no product search or LLM call
+                ai_response, products_info = small_talk_result[:2]
+                error, prompt_stats = None, None
+            else:
+                # 2-6. Save user message, load history, search products, build prompt
+                messages, products_info, prompt_stats = prepare_chat_turn(session_id, user_text)
+
+                # 7. Get AI response
+                ai_response, error = call_groq_api(messages)
             
+            api_used = ai_response is not None and not small_talk_result
             if not ai_response:
                 ai_response = "I'm having trouble processing that. Could you repeat?"
             
             # 8. Save agent response
             save_message(session_id, "agent", ai_response)
+            schedule_summary_refresh(session_id)
             
             # 9. Convert AI response to speech using your existing function
             audio_path = text_to_speech(ai_response)
@@ -593,7 +1006,14 @@ def webrtc_process_audio(request):
                 "user_text": user_text,
                 "agent_text": ai_response,
                 "audio_base64": audio_base64,
-                "products_found": products_info["product_count"]
+                "products_found": products_info["product_count"],
+                "debug_info": {
+                    "api_used": api_used,
+                    "api_error": error,
+                    "small_talk": bool(small_talk_result),
+                    "prompt": prompt_stats,
+                    "llm_circuit": get_llm_client().breaker_state(),
+                },
             })
             
         except Exception as e:
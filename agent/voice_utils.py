@@ -1,11 +1,13 @@
 # agent/voice_utils.py
 import tempfile
 import os
-import whisper
 from gtts import gTTS
 
-# Load Whisper model once at module level (base model is small & fast)
-whisper_model = whisper.load_model("base")  # you can change to "small" or "medium" for better accuracy
+from agent import model_registry
+
+def get_whisper_model():
+    """Whisper model from the lazy registry (settings.WHISPER_MODEL_NAME, "base" by default)."""
+    return model_registry.get("whisper")
 
 def text_to_speech(text, lang='en'):
     """
@@ -23,7 +25,7 @@ def speech_to_text(audio_file_path):
     Supports wav, mp3, m4a, etc.
     """
     try:
-        result = whisper_model.transcribe(audio_file_path)
+        result = get_whisper_model().transcribe(audio_file_path)
         text = str(result.get("text", "")).strip()  # force to string to avoid PyLance warning
         if not text:
             return "Sorry, I could not understand the audio."
@@ -0,0 +1,147 @@
+# agent/warmup.py
+"""
+Process warm-up: load models, prime caches and open connections before the
+first real request, so cold-start costs never land on a customer's turn.
+
+Used by ``manage.py warmup``, by the opt-in startup hook in wsgi/asgi
+(settings.AGENT_WARMUP_ON_STARTUP) and reported by the readiness endpoint.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from agent import model_registry
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    "status": "pending",  # pending -> running -> ready | failed
+    "started_at": None,
+    "finished_at": None,
+    "steps": {},
+    "skipped": {},  # best-effort steps that failed: name -> error
+    "error": None,
+}
+_state_lock = threading.Lock()
+_steps = []
+
+
+def register_step(name, fn, required=True):
+    """
+    Add a named warm-up step; steps run in registration order. A failing
+    required step fails the warm-up; a best-effort one is logged and skipped.
+    """
+    if name not in [step_name for step_name, _, _ in _steps]:
+        _steps.append((name, fn, required))
+
+
+def _load_models():
+    model_registry.warm_up()
+
+
+def _dummy_embedding():
+    from agent.memory_manager import get_embedding_fn
+    get_embedding_fn()(["warm-up query for the product search model"])
+
+
+def _dummy_transcription():
+    from agent.voice_utils import get_whisper_model
+    # One second of silence at Whisper's 16 kHz sample rate
+    get_whisper_model().transcribe(np.zeros(16000, dtype=np.float32), fp16=False)
+
+
+def _build_catalog_caches():
+    from agent.memory_manager import get_product_backend, reload_catalog_index
+    reload_catalog_index()
+    get_product_backend()
+
+
+def _open_llm_connection():
+    from agent.llm_client import get_llm_client
+    get_llm_client().warm()
+
+
+def _load_tokenizer():
+    from agent.prompt_budget import tokenizer_name
+    tokenizer_name()  # loads (and on first run downloads) the tiktoken encoding
+
+
+def _open_database():
+    connection.ensure_connection()
+
+
+register_step("models", _load_models)
+register_step("embedding", _dummy_embedding)
+register_step("transcription", _dummy_transcription)
+register_step("catalog", _build_catalog_caches)
+register_step("tokenizer", _load_tokenizer)
+register_step("database", _open_database)
+# The provider being unreachable at boot must not keep the worker out of rotation
+register_step("llm", _open_llm_connection, required=False)
+
+
+def run_warmup():
+    """Run every warm-up step once; returns the final state dict."""
+    with _state_lock:
+        if _state["status"] in ("running", "ready"):
+            return dict(_state)
+        _state.update(status="running", started_at=time.time(), finished_at=None, steps={}, skipped={},
+                      error=None)
+
+    try:
+        for name, fn, required in _steps:
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                if required:
+                    raise
+                logger.warning(f"Warm-up step '{name}' skipped: {str(e)}")
+                _state["skipped"][name] = str(e)
+                continue
+            _state["steps"][name] = round(time.perf_counter() - start, 3)
+            logger.info(f"Warm-up step '{name}' finished in {_state['steps'][name]}s")
+        status, error = "ready", None
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+        status, error = "failed", str(e)
+    finally:
+        # Close the connection opened on this thread; request threads open their own
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+    with _state_lock:
+        _state.update(status=status, finished_at=time.time(), error=error)
+        return dict(_state)
+
+
+def start_background_warmup():
+    """Kick off warm-up on a daemon thread (startup hook)."""
+    thread = threading.Thread(target=run_warmup, name="agent-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_enabled():
+    return getattr(settings, "AGENT_WARMUP_ON_STARTUP", False)
+
+
+def is_ready():
+    """
+    True once warm-up has finished. Without the startup hook nothing in this
+    process will ever warm up (``manage.py warmup`` runs elsewhere), so the
+    worker is ready as soon as it serves requests and loads lazily.
+    """
+    if not warmup_enabled() and _state["status"] == "pending":
+        return True
+    return _state["status"] == "ready"
+
+
+def warmup_state():
+    with _state_lock:
+        return {**_state, "steps": dict(_state["steps"]), "skipped": dict(_state["skipped"]),
+                "startup_warmup": warmup_enabled(), "models": model_registry.loaded_models()}
@@ -0,0 +1,355 @@
+"""
+Micro-benchmarks for the agent's hot paths.
+
+Usage:
+    python benchmarks.py price_range
+    python benchmarks.py vector_backends
+    python benchmarks.py startup
+    python benchmarks.py history [max_rows]
+    python benchmarks.py sqlite_load
+"""
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from agent.catalog_index import CatalogIndex
+from agent.vector_backends import NumpyBackend
+
+CATEGORIES = ["Laptops", "Desktops", "Monitors", "Keyboards", "Mice",
+              "Graphics Cards", "Storage Devices", "Networking Equipment", "Accessories"]
+
+
+def _synthetic_products(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Product {i}",
+            "category": rng.choice(CATEGORIES),
+            "model": f"Model {i}",
+            "price": rng.randint(10, 5000),
+            "description": f"Name: Product {i}",
+            "stripe_price_id": "price_test",
+        }
+        for i in range(count)
+    ]
+
+
+def _time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_price_range(sizes=(100, 1_000, 10_000, 100_000), repeat=2_000):
+    """Sorted price index vs. the old scan-and-filter approach, per catalog size."""
+    print("=== Price-range lookup latency (µs/call) ===")
+    print(f"{'products':>10} {'index':>10} {'index+cat':>10} {'linear scan':>12}")
+    for size in sizes:
+        products = _synthetic_products(size)
+        index = CatalogIndex(products)
+
+        def linear():
+            return [p for p in products if 500 <= p["price"] <= 900][:10]
+
+        indexed = _time_per_call(lambda: index.products_in_price_range(500, 900, 10), repeat)
+        by_cat = _time_per_call(
+            lambda: index.products_in_price_range(500, 900, 10, category="Monitors"), repeat
+        )
+        scan = _time_per_call(linear, max(1, repeat // 100))
+        print(f"{size:>10} {indexed:>10.2f} {by_cat:>10.2f} {scan:>12.2f}")
+
+
+def _synthetic_vectors(count, dim=384, seed=7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _write_numpy_index(path, products, vectors):
+    np.save(path + ".npy", vectors)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "ids": [f"product_{i}" for i in range(len(products))],
+            "documents": [p["description"] for p in products],
+            "metadatas": [{k: v for k, v in p.items() if k != "description"} for p in products],
+        }, f)
+
+
+def _bench_chroma(products, vectors, queries, tmpdir):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=os.path.join(tmpdir, "chroma"))
+    collection = client.create_collection("bench_products", metadata={"hnsw:space": "cosine"})
+    batch = 5_000
+    for start in range(0, len(products), batch):
+        chunk = products[start:start + batch]
+        collection.add(
+            ids=[f"product_{i}" for i in range(start, start + len(chunk))],
+            documents=[p["description"] for p in chunk],
+            metadatas=[{k: v for k, v in p.items() if k != "description"} for p in chunk],
+            embeddings=vectors[start:start + len(chunk)].tolist(),
+        )
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=5, where={"category": "Monitors"})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_vector_backends(sizes=(30, 10_000, 1_000_000), n_queries=50):
+    """Top-5 filtered search latency: numpy brute force vs. Chroma HNSW."""
+    print("=== Product vector search, top-5 with category filter (ms/query, p50 / p99) ===")
+    print(f"{'products':>10} {'numpy':>18} {'chroma':>18}")
+    queries = _synthetic_vectors(n_queries, seed=99)
+    for size in sizes:
+        products = _synthetic_products(size)
+        vectors = _synthetic_vectors(size)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "product_vectors")
+            _write_numpy_index(path, products, vectors)
+            backend = NumpyBackend(path)
+            numpy_latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                backend.query(query, n_results=5, category="Monitors")
+                numpy_latencies.append(time.perf_counter() - start)
+            del backend
+
+            try:
+                chroma_latencies = _bench_chroma(products, vectors, queries, tmpdir)
+                chroma = _format_latency(chroma_latencies)
+            except ImportError:
+                chroma = "not installed"
+        print(f"{size:>10} {_format_latency(numpy_latencies):>18} {chroma:>18}")
+
+
+def _format_latency(latencies):
+    ms = np.array(latencies) * 1e3
+    return f"{np.percentile(ms, 50):.3f} / {np.percentile(ms, 99):.3f}"
+
+
+HEAVY_MODULES = ("torch", "whisper", "sentence_transformers", "chromadb", "onnxruntime")
+
+
+def bench_startup(commands=(["check"], ["showmigrations", "agent"])):
+    """Wall time of management commands and which heavy model libraries they import."""
+    print("=== manage.py startup (python -X importtime) ===")
+    manage = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manage.py")
+    for args in commands:
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", manage, *args],
+            capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - start
+        imported = {
+            line.rsplit("|", 1)[-1].strip().split(".")[0]
+            for line in proc.stderr.splitlines() if line.startswith("import time:")
+        }
+        heavy = [name for name in HEAVY_MODULES if name in imported]
+        print(f"manage.py {' '.join(args):<22} {elapsed:6.2f}s  exit={proc.returncode}  "
+              f"heavy imports: {', '.join(heavy) or 'none'}")
+
+
+def _setup_django(db_path):
+    """
+    Point Django at a scratch SQLite file and create the schema there. The
+    history cache and write-behind are off so every call measures the query.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "website_sale_agent.settings")
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.HISTORY_CACHE_ENABLED = False
+    settings.CHAT_LOG_WRITE_BEHIND = False
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def _insert_messages(db_path, start, stop, per_session=50):
+    """Append rows start..stop-1 (sessions of ``per_session`` messages, rising timestamps)."""
+    import sqlite3
+    from datetime import datetime, timedelta
+
+    base = datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_path)
+    batch = 50_000
+    for lo in range(start, stop, batch):
+        conn.executemany(
+            "INSERT INTO agent_chatmessage (id, session_id, sender, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i + 1, f"sess_{i // per_session}", "user" if i % 2 else "agent", f"message {i}",
+                 (base + timedelta(milliseconds=i)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                for i in range(lo, min(lo + batch, stop))
+            ),
+        )
+        conn.commit()
+    conn.close()
+
+
+def bench_history(sizes=(10_000, 100_000, 1_000_000, 10_000_000), repeat=500, per_session=50):
+    """
+    History latency as the chat log grows: get_history (keyset by timestamp) and
+    the id-cursor lookups clients hit every turn (delta after last_seen_id,
+    /history/ page, newest id), vs. the get_history query without an index.
+    """
+    if len(sys.argv) > 2:
+        sizes = tuple(size for size in sizes if size <= int(sys.argv[2]))
+    tmpdir = tempfile.mkdtemp()
+    db_path = os.path.join(tmpdir, "history_bench.sqlite3")
+    _setup_django(db_path)
+
+    from django.db import connection
+    from agent.memory_service import get_history, get_history_page, latest_message_id
+    from agent.models import ChatMessage
+
+    rng = random.Random(3)
+    print("=== History lookup latency: last 10 messages of one session (µs/call) ===")
+    print(f"{'rows':>12} {'get_history':>12} {'next page':>10} {'after id':>9} "
+          f"{'id page':>8} {'latest id':>10} {'no index':>12}")
+    inserted = 0
+    for size in sizes:
+        _insert_messages(db_path, inserted, size, per_session)
+        inserted = size
+        connection.close()
+        sessions = [f"sess_{rng.randrange(size // per_session)}" for _ in range(repeat)]
+
+        calls = itertools.cycle(sessions)
+        latest = _time_per_call(lambda: get_history(next(calls), limit=10), repeat)
+        pages = {session: get_history(session, limit=10)[0] for session in set(sessions[:50])}
+        anchors = itertools.cycle(pages.items())
+
+        def next_page():
+            session, oldest = next(anchors)
+            return get_history(session, limit=10, before=(oldest.timestamp, oldest.id))
+
+        paged = _time_per_call(next_page, repeat)
+
+        # Id-cursor paths; the delta query is get_messages_after without the history cache
+        id_anchors = itertools.cycle([(session, oldest.id) for session, oldest in pages.items()])
+
+        def delta():
+            session, after_id = next(id_anchors)
+            return list(ChatMessage.objects.filter(session_id=session, id__gt=after_id).order_by("id")[:50])
+
+        after = _time_per_call(delta, repeat)
+        id_paged = _time_per_call(lambda: get_history_page(next(id_anchors)[0], limit=10), repeat)
+        newest = _time_per_call(lambda: latest_message_id(next(calls)), repeat)
+
+        # Same query with the planner forbidden from using an index (full scan)
+        scans = min(repeat, max(3, 2_000_000 // size))
+        with connection.cursor() as cursor:
+            def unindexed():
+                cursor.execute(
+                    "SELECT id FROM agent_chatmessage NOT INDEXED WHERE session_id = %s "
+                    "ORDER BY timestamp DESC, id DESC LIMIT 10",
+                    [rng.choice(sessions)],
+                )
+                return cursor.fetchall()
+
+            scan = _time_per_call(unindexed, scans)
+        print(f"{size:>12,} {latest:>12.1f} {paged:>10.1f} {after:>9.1f} "
+              f"{id_paged:>8.1f} {newest:>10.1f} {scan:>12.1f}")
+    connection.close()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _sqlite_load_run(db_path, pragmas, timeout, writers, readers, seconds):
+    """Mixed chat-log load on one SQLite file; returns (writes/s, reads/s, lock errors)."""
+    import sqlite3
+    import threading
+
+    setup = sqlite3.connect(db_path)
+    for name, value in pragmas.items():
+        setup.execute(f"PRAGMA {name} = {value}")
+    setup.execute("CREATE TABLE IF NOT EXISTS agent_chatmessage (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                  "session_id VARCHAR(100), sender VARCHAR(20), message TEXT, timestamp DATETIME)")
+    setup.execute("CREATE INDEX IF NOT EXISTS chatmsg_session_ts_idx ON agent_chatmessage (session_id, timestamp)")
+    setup.commit()
+    setup.close()
+
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker(kind, seed):
+        rng = random.Random(seed)
+        conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        done = locked = 0
+        while time.perf_counter() < stop:
+            session = f"sess_{rng.randrange(500)}"
+            try:
+                if kind == "writes":
+                    conn.execute("INSERT INTO agent_chatmessage (session_id, sender, message, timestamp) "
+                                 "VALUES (?, 'user', 'hello there', datetime('now'))", (session,))
+                else:
+                    conn.execute("SELECT id, sender, message FROM agent_chatmessage WHERE session_id = ? "
+                                 "ORDER BY timestamp DESC, id DESC LIMIT 10", (session,)).fetchall()
+                done += 1
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+        conn.close()
+        with lock:
+            counts[kind] += done
+            counts["locked"] += locked
+
+    threads = [threading.Thread(target=worker, args=("writes", i)) for i in range(writers)]
+    threads += [threading.Thread(target=worker, args=("reads", 100 + i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["writes"] / seconds, counts["reads"] / seconds, counts["locked"]
+
+
+def bench_sqlite_load(writers=4, readers=8, seconds=5.0):
+    """Chat-log throughput under concurrent writers/readers: stock SQLite vs. the tuned profile."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "website_sale_agent.settings")
+    from agent.sqlite_tuning import sqlite_pragmas
+
+    profiles = [
+        ("stock (rollback journal, FULL)", {}, 5.0),
+        ("tuned (agent.sqlite_tuning)", sqlite_pragmas({"OPTIONS": {"timeout": 20.0}}, wal=True), 20.0),
+    ]
+    print(f"=== SQLite chat-log load: {writers} writers + {readers} readers, {seconds:.0f}s each ===")
+    print(f"{'profile':<32} {'writes/s':>10} {'reads/s':>10} {'locked errors':>14}")
+    for label, pragmas, timeout in profiles:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            writes, reads, locked = _sqlite_load_run(
+                os.path.join(tmpdir, "load.sqlite3"), pragmas, timeout, writers, readers, seconds
+            )
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        print(f"{label:<32} {writes:>10.0f} {reads:>10.0f} {locked:>14}")
+
+
+BENCHMARKS = {
+    "price_range": bench_price_range,
+    "vector_backends": bench_vector_backends,
+    "startup": bench_startup,
+    "history": bench_history,
+    "sqlite_load": bench_sqlite_load,
+}
+
+if __name__ == "__main__":
+    names = [name for name in sys.argv[1:] if name in BENCHMARKS] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
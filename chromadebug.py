@@ -24,16 +24,16 @@ def debug_chromadb():
     
     try:
         # Get the products collection
-        collection = client.get_collection("products")
+        collection = client.get_collection("products_data")
         print(f"✅ Products collection found")
         
     except Exception as e:
         print(f"❌ Error getting products collection: {e}")
-        print("   Try creating collection with: collection = client.get_or_create_collection('products')")
+        print("   Try creating collection with: collection = client.get_or_create_collection('products_data')")
         
         # Try to create collection if it doesn't exist
         try:
-            collection = client.get_or_create_collection("products")
+            collection = client.get_or_create_collection("products_data")
             print(f"✅ Created products collection")
         except Exception as e2:
             print(f"❌ Error creating collection: {e2}")
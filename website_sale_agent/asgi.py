@@ -1 +1,20 @@
-# asgi.py placeholder
+"""
+ASGI config for website_sale_agent project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn website_sale_agent.asgi:application``)
+to run the async chat pipeline at /agent/chat/async/.
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website_sale_agent.settings')
+
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AGENT_WARMUP_ON_STARTUP:
+    from agent.warmup import start_background_warmup
+    start_background_warmup()
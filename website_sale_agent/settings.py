@@ -30,12 +30,36 @@ INSTALLED_APPS = [
 ]
 # settings.py
 
+# Per-session chat history ring buffers (agent/history_cache.py): evicted after
+# HISTORY_CACHE_IDLE_SECONDS without a read; sessions x bytes per session bounds memory.
+# Local memory is per process: with several workers set HISTORY_CACHE_REDIS_URL so
+# every worker shares the buffers and their version counters.
+HISTORY_CACHE_ENABLED = os.getenv("HISTORY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_CACHE_MESSAGES = int(os.getenv("HISTORY_CACHE_MESSAGES", "50"))
+HISTORY_CACHE_IDLE_SECONDS = int(os.getenv("HISTORY_CACHE_IDLE_SECONDS", "1800"))
+HISTORY_CACHE_MAX_BYTES_PER_SESSION = int(os.getenv("HISTORY_CACHE_MAX_BYTES_PER_SESSION", str(64 * 1024)))
+HISTORY_CACHE_MEMORY_BUDGET = int(os.getenv("HISTORY_CACHE_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+HISTORY_CACHE_REDIS_URL = os.getenv("HISTORY_CACHE_REDIS_URL")
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    'history': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat-history',
+        'TIMEOUT': HISTORY_CACHE_IDLE_SECONDS,
+        # Two keys per session: the buffer and its version counter
+        'OPTIONS': {'MAX_ENTRIES': max(2, 2 * (HISTORY_CACHE_MEMORY_BUDGET // HISTORY_CACHE_MAX_BYTES_PER_SESSION))},
+    },
 }
+if HISTORY_CACHE_REDIS_URL:
+    CACHES['history'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': HISTORY_CACHE_REDIS_URL,
+        'TIMEOUT': HISTORY_CACHE_IDLE_SECONDS,
+    }
 # Middleware
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -76,9 +100,111 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Seconds to wait for the write lock (also sets the profile's busy_timeout pragma)
+        "OPTIONS": {"timeout": 20},
+        # Keep connections open across requests (0 = close after each request)
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Optional separate SQLite file for ChatMessage/ConversationSummary (agent.db_router);
+# run `python manage.py migrate --database chatlog` after enabling it
+CHAT_LOG_DATABASE = os.getenv("CHAT_LOG_DATABASE")
+if CHAT_LOG_DATABASE:
+    DATABASES["chatlog"] = {**DATABASES["default"], "NAME": CHAT_LOG_DATABASE}
+    DATABASE_ROUTERS = ["agent.db_router.ChatLogRouter"]
+
+# Busy timeout, mmap and page cache for every SQLite connection
+# (agent/sqlite_tuning.py); SQLITE_PRAGMAS overrides individual pragmas
+SQLITE_PERFORMANCE_PROFILE = os.getenv("SQLITE_PERFORMANCE_PROFILE", "true").lower() in ("1", "true", "yes")
+# Also WAL + synchronous=NORMAL. Off by default: WAL converts the database file
+# for good and adds db.sqlite3-wal/-shm files, so turn it on for deployments
+# rather than the committed development database
+SQLITE_WAL = os.getenv("SQLITE_WAL", "false").lower() in ("1", "true", "yes")
+SQLITE_PRAGMAS = {}
+
+# Models and vector store, loaded lazily by agent.model_registry
+CHROMA_PATH = BASE_DIR / "chroma_db"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL_NAME", "base")  # "small"/"medium" for better accuracy
+
+# Warm models and caches in a background thread when a worker boots; /agent/ready/
+# reports 503 until it finishes (and 200 straight away when this is off).
+# Off by default so management commands stay fast.
+AGENT_WARMUP_ON_STARTUP = os.getenv("AGENT_WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Push Product model edits to the products vector collection in the background
+CATALOG_LIVE_SYNC = os.getenv("CATALOG_LIVE_SYNC", "true").lower() in ("1", "true", "yes")
+# Retries (with backoff) of a failed sync batch before applying its events one by one
+CATALOG_SYNC_RETRIES = int(os.getenv("CATALOG_SYNC_RETRIES", "3"))
+# How often each worker compares its catalog caches with the shared CatalogVersion row
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "5"))
+
+# LLM provider (OpenAI-compatible chat completions). Point LLM_BASE_URL at a
+# local stub server to exercise agent.llm_client without calling Groq.
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Also retry read timeouts / dropped responses (each retry can add a full LLM_READ_TIMEOUT)
+LLM_RETRY_READ_ERRORS = os.getenv("LLM_RETRY_READ_ERRORS", "false").lower() in ("1", "true", "yes")
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Total seconds one call may spend waiting between retries; a longer Retry-After
+# fails the call at once so the chat turn falls back instead of stalling
+LLM_MAX_RETRY_WAIT = float(os.getenv("LLM_MAX_RETRY_WAIT", "2"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")  # needs the 'h2' package
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# Circuit breaker: open when half of the last 20 calls failed or took 10 s+,
+# answer with the product-list fallback for 30 s, then probe once
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "10"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+# Semantic response cache: reuse replies to near-duplicate first-turn/context-free
+# questions that retrieved the same products; cleared when the catalog changes
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "600"))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# Prompt token budget: history turns are truncated/dropped oldest-first and
+# product context trimmed so each LLM request stays under PROMPT_MAX_INPUT_TOKENS
+PROMPT_MAX_INPUT_TOKENS = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "3000"))
+PROMPT_MAX_TURN_TOKENS = int(os.getenv("PROMPT_MAX_TURN_TOKENS", "300"))
+PROMPT_MAX_PRODUCT_TOKENS = int(os.getenv("PROMPT_MAX_PRODUCT_TOKENS", "1200"))
+
+# Rolling conversation summaries: once 6 messages beyond the last 4 are unsummarized,
+# a background worker folds them into the session summary used in the prompt
+CONVERSATION_SUMMARY_ENABLED = os.getenv("CONVERSATION_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_REFRESH_EVERY_MESSAGES = int(os.getenv("SUMMARY_REFRESH_EVERY_MESSAGES", "6"))
+SUMMARY_KEEP_VERBATIM_MESSAGES = int(os.getenv("SUMMARY_KEEP_VERBATIM_MESSAGES", "4"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))
+
+# Queue save_message writes and bulk-insert them from a background thread
+# (drained at shutdown); set to false to write each message synchronously
+CHAT_LOG_WRITE_BEHIND = os.getenv("CHAT_LOG_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+# Retries (with backoff) of a failed batch before falling back to row-by-row inserts
+CHAT_LOG_WRITE_RETRIES = int(os.getenv("CHAT_LOG_WRITE_RETRIES", "3"))
+
+# Max history rows returned per chat turn to a client that sends last_seen_id
+HISTORY_DELTA_LIMIT = int(os.getenv("HISTORY_DELTA_LIMIT", "50"))
+
+# Threads available to the async chat pipeline for embedding/vector search
+CHAT_RETRIEVAL_WORKERS = int(os.getenv("CHAT_RETRIEVAL_WORKERS", "4"))
+
+# Product search backend: "chroma" (persistent HNSW collection) or "numpy"
+# (brute-force search over a memory-mapped embedding matrix exported at load time)
+PRODUCT_SEARCH_BACKEND = os.getenv("PRODUCT_SEARCH_BACKEND", "chroma")
+PRODUCT_VECTORS_PATH = BASE_DIR / "chroma_db" / "product_vectors"
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = []
 
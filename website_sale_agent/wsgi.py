@@ -11,3 +11,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website_sale_agent.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AGENT_WARMUP_ON_STARTUP:
+    from agent.warmup import start_background_warmup
+    start_background_warmup()